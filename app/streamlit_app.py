@@ -1,12 +1,12 @@
 import streamlit as st
 import numpy as np
+import math
 import os, urllib
 import sys
 import plotly.graph_objects as go
 from scipy import stats
 import scipy.stats
 import statsmodels.stats.api as sms
-import pickle
 
 
 def mean_confidence_interval(data, confidence=0.95):
@@ -25,6 +25,7 @@ from blackjack import (
     Cards,
     Deck,
     Player,
+    summarize_sessions,
     resolve_player_action,
     Hand,
     PlayerResultTypes,
@@ -33,7 +34,21 @@ from blackjack import (
     play,
     resolve_environment,
     parallel_processing,
+    SimulationExecutor,
+    SessionLimits,
 )
+from sequential import run_sequential, PRECISION_REACHED, DECISION_REACHED
+from variance import control_variate_mean
+from repricing import record_sessions, reprice
+from storage import load_results
+from cache import ResultCache
+from accumulators import SessionSummary
+
+# more sessions than this are summarized by the workers instead of kept
+MAX_KEPT_SESSIONS = 100000
+# most rounds recorded for repricing, six bytes each
+MAX_LOGGED_ROUNDS = 10000000
+
 
 # Streamlit encourages well-structured code, like starting execution in a main() function.
 def main():
@@ -68,26 +83,24 @@ def show_cached():
         st.markdown(
             "Below is a result of 5000 session samples of 1000 hands under standard Las Vegas Rules(hit soft 17 and late surrender allowed). Bet sizes employed are $25 for counts of 0 and negatives, and multipliers of 8 for count of 1, 16 for count of 2 and 32 for count of 3+"
         )
-        file = open("data/vegas_aggressive_bets_results.obj", "rb")
-        results = pickle.load(file)
-        results = [i * 25 for i in results]
-        layout_results(results)
+        results = load_results("data/vegas_aggressive_bets_results.bjres")
+        results = results.get_column("profit") * 25
+        layout_results(SessionSummary().update(results))
     if scenarios == "Vegas Rules Conservative Betting":
         st.markdown(
             "Below is a result of 5000 session samples of 1000 hands under standard Las Vegas Rules(hit soft 17 and late surrender allowed). Bet sizes employed are $25 for counts of 0 and negatives, and multipliers of 4 for count of 1, 8 for count of 2 and 16 for count of 3+"
         )
-        file = open("data/vegas_conservative_bets_results.obj", "rb")
-        results = pickle.load(file)
-        results = [i * 25 for i in results]
-        layout_results(results)
+        results = load_results("data/vegas_conservative_bets_results.bjres")
+        results = results.get_column("profit") * 25
+        layout_results(SessionSummary().update(results))
 
 
 def run_sims():
 
     button_start = st.sidebar.button("Start Sim")
-    bet_size = st.sidebar.number_input("Bet Size: ", value=1, step=1)
+    bet_size = st.sidebar.number_input("Bet Size: ", min_value=1, value=1, step=1)
     num_samples = st.sidebar.number_input(
-        "Number of Sessions: ", min_value=1, max_value=1000, value=100, step=1
+        "Number of Sessions: ", min_value=1, max_value=10000000, value=100, step=1
     )
     iterations = st.sidebar.number_input(
         "Number of Hands per Session: ",
@@ -106,6 +119,45 @@ def run_sims():
         value=0.35,
         step=0.01,
     )
+    bankroll = st.sidebar.number_input(
+        "Bankroll ($): ", min_value=1.0, value=1000.0, step=100.0
+    )
+    table_min = st.sidebar.number_input(
+        "Table minimum ($, 0 for none): ", min_value=0.0, value=0.0, step=5.0
+    )
+    table_max = st.sidebar.number_input(
+        "Table maximum ($, 0 for none): ", min_value=0.0, value=0.0, step=100.0
+    )
+    win_goal = st.sidebar.number_input(
+        "Stop a session once it is up ($, 0 to play every hand): ",
+        min_value=0.0,
+        value=0.0,
+        step=100.0,
+    )
+    stop_at_ruin = st.sidebar.checkbox(
+        "Stop a session once the bankroll can not cover the table minimum"
+    )
+
+    target_precision = st.sidebar.number_input(
+        "Stop early once the 90% confidence interval is within +/- $ (0 to run every session): ",
+        min_value=0.0,
+        value=0.0,
+        step=1.0,
+    )
+    stop_on_decision = st.sidebar.checkbox(
+        "Stop early once it is clear whether the strategy is profitable"
+    )
+    seed = st.sidebar.number_input(
+        "Random seed (the same settings and seed reuse stored sessions): ",
+        min_value=0,
+        value=0,
+        step=1,
+    )
+    reuse_hands = st.sidebar.checkbox(
+        "Reuse the recorded hands when only the bets change (no table limits or early stops)"
+    )
+
+    show_outliers = st.sidebar.checkbox("Show the most outlying sessions", value=True)
 
     bet_multipler_neg = st.sidebar.slider(
         "Betting multiplier for count of 0 and negatives", 0, 100, 1
@@ -140,27 +192,130 @@ def run_sims():
         try:
             warning = st.warning("Running simulations. Please hold...")
             progress_bar = st.progress(0)
-            chunks = run_in_chunks(num_samples, 10)
-            final_results = []
-            for idx, n_samples_small in enumerate(chunks):
-                player = Player(
-                    bankroll=1000,
-                    hard_policy=hard_policy,
-                    soft_policy=soft_policy,
-                    split_policy=split_policy,
-                    betting_policy=betting_policy,
+            player = Player(
+                bankroll=bankroll / bet_size,
+                hard_policy=hard_policy,
+                soft_policy=soft_policy,
+                split_policy=split_policy,
+                betting_policy=betting_policy,
+            )
+            # the simulation runs in units of the bet size
+            limits = None
+            if table_min > 0 or table_max > 0 or win_goal > 0 or stop_at_ruin:
+                limits = SessionLimits(
+                    table_min=table_min / bet_size,
+                    table_max=table_max / bet_size if table_max > 0 else None,
+                    win_goal=win_goal / bet_size if win_goal > 0 else None,
+                    stop_at_ruin=stop_at_ruin,
+                )
+            if target_precision > 0 or stop_on_decision:
+                # Number of Sessions is the most that will be run
+                final_results, stats, interval, reason = run_sequential(
+                    player,
+                    num_decks=num_decks,
+                    iterations=iterations,
+                    threshold=cut_card_threshhold,
+                    seed=int(seed),
+                    executor=get_executor(),
+                    half_width=(
+                        target_precision / bet_size if target_precision > 0 else None
+                    ),
+                    decide=stop_on_decision,
+                    confidence=0.9,
+                    max_samples=num_samples,
+                    look_every=min(100, num_samples),
+                    limits=limits,
+                    progress_callback=lambda done, total: progress_bar.progress(
+                        done / total
+                    ),
+                )
+                stopped = {
+                    PRECISION_REACHED: "the confidence interval was tight enough",
+                    DECISION_REACHED: "the result was clear",
+                }.get(reason, "every session was run")
+                st.markdown(
+                    "Stopped after {} sessions because {}. Sequential 90% Confidence Interval: [{}, {}]".format(
+                        stats.get_count(),
+                        stopped,
+                        round(interval[0] * bet_size, 3),
+                        round(interval[1] * bet_size, 3),
+                    )
+                )
+                layout_results(
+                    SessionSummary().update(final_results * bet_size),
+                    show_outliers=show_outliers,
+                )
+                return
+
+            if num_samples > MAX_KEPT_SESSIONS:
+                # too many sessions to keep, the workers summarize them
+                summary = summarize_sessions(
+                    player,
+                    num_decks=num_decks,
+                    iterations=iterations,
+                    n_samples=num_samples,
+                    threshold=cut_card_threshhold,
+                    seed=int(seed),
+                    executor=get_executor(),
+                    limits=limits,
+                    progress_callback=lambda done, total: progress_bar.progress(
+                        done / total
+                    ),
+                )
+                layout_results(summary.scale(bet_size), show_outliers=show_outliers)
+                return
+
+            reuse_hands = reuse_hands and limits is None
+            if reuse_hands and num_samples * iterations > MAX_LOGGED_ROUNDS:
+                st.info(
+                    "Too many hands to record for reuse, running the sessions instead."
+                )
+                reuse_hands = False
+            if reuse_hands:
+                # play does not depend on the wager, so the same hands are
+                # priced with whatever the betting sliders say, and with the
+                # same seed they are the hands a full run would play
+                log = get_round_log(
+                    num_decks, iterations, num_samples, cut_card_threshhold, seed
                 )
-                results = parallel_processing(
+                final_results = reprice(log, betting_policy)
+                controls = log.get_controls()
+            else:
+                final_results, controls = run_streamed(
+                    player,
+                    num_decks,
+                    iterations,
+                    num_samples,
+                    cut_card_threshhold,
+                    limits,
+                    seed,
+                    progress_bar,
+                )
+            control = None
+            # the flat bet mean is for full length sessions, so there is no
+            # control when sessions can stop early
+            if num_samples >= 3 and limits is None:
+                # estimated once for these rules and cached, whatever the
+                # seed or number of sessions of the run
+                control_mean, control_mean_sem = get_result_cache().get_flat_bet_mean(
                     player,
                     num_decks=num_decks,
                     iterations=iterations,
-                    n_samples=n_samples_small,
                     threshold=cut_card_threshhold,
                 )
-                final_results = final_results + results
-                progress_bar.progress(min(idx / len(chunks), 1.0))
-            final_results = [i * bet_size for i in final_results]
-            layout_results(final_results)
+                control = control_variate_mean(
+                    final_results * bet_size,
+                    controls * bet_size,
+                    control_mean * bet_size,
+                    control_mean_sem * bet_size,
+                    confidence=0.9,
+                )
+            final_results = final_results * bet_size
+            layout_results(
+                SessionSummary().update(final_results),
+                control,
+                show_outliers=show_outliers,
+            )
 
         finally:
             if warning is not None:
@@ -169,12 +324,55 @@ def run_sims():
                 progress_bar.empty()
 
 
-def layout_results(final_results):
-    statistics, p_value = run_t_test(final_results)
-    mean, conf_low, conf_high = get_conf_interval(final_results, 0.9)
+def run_streamed(
+    player, num_decks, iterations, num_samples, threshold, limits, seed, progress_bar
+):
+    # sessions already run with these settings and seed come off disk, and
+    # only the rest are simulated. a stopped script closes the stream of
+    # batches underneath, which cancels the rest of the run
+    return get_result_cache().run(
+        player,
+        num_decks=num_decks,
+        iterations=iterations,
+        n_samples=num_samples,
+        threshold=threshold,
+        seed=int(seed),
+        executor=get_executor(),
+        limits=limits,
+        with_control=True,
+        progress_callback=lambda done, total: progress_bar.progress(done / total),
+    )
+
+
+# recorded once per game, then repriced for every betting ramp. only the
+# last couple of recordings are kept, they can be tens of MB each
+@st.cache(allow_output_mutation=True, show_spinner=False, max_entries=2)
+def get_round_log(num_decks, iterations, num_samples, threshold, seed):
+    player = Player(
+        bankroll=1000,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    return record_sessions(
+        player,
+        num_decks=num_decks,
+        iterations=iterations,
+        n_samples=num_samples,
+        threshold=threshold,
+        seed=int(seed),
+        executor=get_executor(),
+    )
+
+
+def layout_results(summary, control=None, show_outliers=True):
+    # the numbers come from the summary, so they never need every result
+    statistics, p_value = run_t_test(summary)
+    mean, conf_low, conf_high = get_conf_interval(summary, 0.9)
     result = "Likely Profitable" if mean > 0 else "Likely Not profitable"
     st.markdown("## Simulation Result: {}".format(result))
-    draw_plotly_histogram(final_results)
+    draw_plotly_histogram(summary)
     st.markdown("Average Profits per Session: ${}".format(round(mean, 2)))
     st.markdown("One-tailed test p-value: {}".format(round(p_value, 3)))
     st.markdown(
@@ -182,21 +380,37 @@ def layout_results(final_results):
             round(conf_low, 3), round(conf_high, 3)
         )
     )
-    draw_plotly_boxplot(final_results)
-    st.markdown("Most Profitable Session: ${}".format(round(np.max(final_results), 2)))
-    st.markdown("Median Session: ${}".format(round(np.median(final_results), 2)))
-    st.markdown("Least Profitable Session: ${}".format(round(np.min(final_results), 2)))
-
-
-def run_in_chunks(num: int, divisor: int):
-    quotient, remainder = divmod(num, divisor)
-    return (
-        [divisor] * quotient + [remainder] if remainder != 0 else [divisor] * quotient
+    if control is not None:
+        adjusted, adjusted_low, adjusted_high, beta = control
+        # the error of the control's mean is in the adjusted interval, and for
+        # long enough runs it is no longer narrower than the plain one
+        if adjusted_high - adjusted_low < conf_high - conf_low:
+            st.markdown(
+                "Flat bet control adjusted average: ${} (coefficient {}), 90% Confidence Interval: [{}, {}]".format(
+                    round(adjusted, 2),
+                    round(beta, 3),
+                    round(adjusted_low, 3),
+                    round(adjusted_high, 3),
+                )
+            )
+    draw_plotly_boxplot(summary, show_outliers)
+    session_stats = summary.get_stats()
+    st.markdown(
+        "Most Profitable Session: ${}".format(round(session_stats.get_max(), 2))
+    )
+    st.markdown("Median Session: ${}".format(round(summary.get_median(), 2)))
+    st.markdown(
+        "Least Profitable Session: ${}".format(round(session_stats.get_min(), 2))
     )
 
 
-def draw_plotly_histogram(results):
-    fig = go.Figure(data=[go.Histogram(x=results)])
+# the plots are drawn from the summary's bin counts and quantiles, so what
+# goes to the browser is the same size however many sessions were run
+def draw_plotly_histogram(summary):
+    edges, counts = summary.get_histogram().get_bins()
+    fig = go.Figure(
+        data=[go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges))]
+    )
     fig.update_layout(
         title_text="Sampled Results",  # title of plot
         title_x=0.5,
@@ -207,34 +421,73 @@ def draw_plotly_histogram(results):
     st.plotly_chart(fig, use_container_width=True)
 
 
-def draw_plotly_boxplot(results):
-    fig = go.Figure(
-        data=[
-            go.Box(
-                y=results,
-                boxpoints="all",  # can also be outliers, or suspectedoutliers, or False
-                jitter=0.3,  # add some jitter for a better separation between points
-                pointpos=-1.8,  # relative position of points wrt box
+def draw_plotly_boxplot(summary, show_outliers=True):
+    box = summary.get_box()
+    data = [
+        go.Box(
+            name="Sessions",
+            q1=[box["q1"]],
+            median=[box["median"]],
+            q3=[box["q3"]],
+            lowerfence=[box["lowerfence"]],
+            upperfence=[box["upperfence"]],
+            mean=[box["mean"]],
+            boxpoints=False,
+        )
+    ]
+    if show_outliers and len(box["outliers"]):
+        data.append(
+            go.Scatter(
+                x=["Sessions"] * len(box["outliers"]),
+                y=box["outliers"],
+                mode="markers",
+                name="Outliers",
             )
-        ]
+        )
+    fig = go.Figure(data=data)
+    fig.update_layout(
+        title_text="Profits($)",
+        xaxis_title="Distribution",
+        title_x=0.5,
+        showlegend=False,
     )
-    fig.update_layout(title_text="Profits($)", xaxis_title="Distribution", title_x=0.5)
 
     st.plotly_chart(fig, use_container_width=True)
 
 
-def run_t_test(final_results):
-    return stats.ttest_1samp(final_results, 0, alternative="greater")
+def run_t_test(summary):
+    # one sample t-test of mean > 0 from the running stats
+    session_stats = summary.get_stats()
+    n = session_stats.get_count()
+    mean, sem = session_stats.get_mean(), session_stats.get_sem()
+    if sem == 0:
+        # every session came out the same, as ttest_1samp this has no answer
+        # unless the mean is off 0
+        statistic = math.copysign(math.inf, mean) if mean else math.nan
+    else:
+        statistic = mean / sem
+    return statistic, stats.t.sf(statistic, n - 1)
 
 
-def get_conf_interval(final_results, confidence=0.95):
-    a = 1.0 * np.array(final_results)
-    n = len(a)
-    m, se = np.mean(a), stats.sem(a)
+def get_conf_interval(summary, confidence=0.95):
+    session_stats = summary.get_stats()
+    n = session_stats.get_count()
+    m, se = session_stats.get_mean(), session_stats.get_sem()
     h = se * stats.t.ppf((1 + confidence) / 2.0, n - 1)
     return m, m - h, m + h
 
 
+# one pool of warm workers for the whole server, kept across reruns
+@st.cache(allow_output_mutation=True, show_spinner=False)
+def get_executor():
+    return SimulationExecutor()
+
+
+@st.cache(allow_output_mutation=True, show_spinner=False)
+def get_result_cache():
+    return ResultCache(os.path.join(ROOT, ".cache", "results"))
+
+
 @st.cache(show_spinner=False)
 def get_file_content_as_string(path):
     url = "https://raw.githubusercontent.com/yjs1210/cardcounting/master/app/" + path
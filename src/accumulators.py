@@ -0,0 +1,358 @@
+import math
+
+import numpy
+
+
+class RunningStats:
+    """Count, mean, sum of squared deviations, minimum and maximum of a
+    stream of session results, kept with Welford's update. Batches are folded
+    in with the pairwise merge of Chan et al., so stats kept by different
+    workers can be merged without the underlying results."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def update(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if len(values):
+            batch = RunningStats()
+            batch.count = len(values)
+            batch.mean = float(values.mean())
+            batch.m2 = float(((values - batch.mean) ** 2).sum())
+            batch.min = float(values.min())
+            batch.max = float(values.max())
+            self.merge(batch)
+        return self
+
+    def merge(self, other: "RunningStats"):
+        count = self.count + other.count
+        if count == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def get_count(self):
+        return self.count
+
+    def get_mean(self):
+        return self.mean
+
+    def get_min(self):
+        return self.min if self.count else math.nan
+
+    def get_max(self):
+        return self.max if self.count else math.nan
+
+    def get_variance(self, ddof: int = 1):
+        if self.count <= ddof:
+            return math.nan
+        return self.m2 / (self.count - ddof)
+
+    def get_std(self, ddof: int = 1):
+        return math.sqrt(self.get_variance(ddof))
+
+    def get_sem(self):
+        return math.sqrt(self.get_variance() / self.count) if self.count else math.nan
+
+
+class QuantileSketch:
+    """KLL sketch of a stream of session results, for quantiles in memory
+    that grows only with log(count).
+
+    Level h holds values that each stand for 2^h results. A level over its
+    capacity is sorted and compacted, every other value, starting at a
+    random one of the first two, moving up a level. Capacities shrink by
+    2/3 per level down from the top, so the rank error is about 1.7 / k of
+    the count. Sketches with the same k merge level by level, so sketches
+    kept by different workers can be merged without the underlying
+    results."""
+
+    def __init__(self, k: int = 200, seed=None):
+        if k < 2:
+            raise ValueError("k has to be at least 2")
+        self.k = k
+        self.rng = numpy.random.default_rng(seed)
+        self.levels = [numpy.empty(0, dtype=numpy.float64)]
+        self.count = 0
+
+    def get_capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.get_capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(numpy.empty(0, dtype=numpy.float64))
+                items = numpy.sort(items)
+                # an odd value out stays behind, so no weight is lost
+                odd = len(items) % 2
+                promoted = items[odd + self.rng.integers(2) :: 2]
+                self.levels[level] = items[:odd]
+                self.levels[level + 1] = numpy.concatenate(
+                    [self.levels[level + 1], promoted]
+                )
+            level += 1
+
+    def update(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        self.levels[0] = numpy.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self.compress()
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        if other.k != self.k:
+            raise ValueError("Only sketches with the same k can be merged")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(numpy.empty(0, dtype=numpy.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = numpy.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.compress()
+        return self
+
+    def get_count(self):
+        return self.count
+
+    def get_weighted_values(self):
+        # the retained values in order with how many results each stands for
+        values = numpy.concatenate(self.levels)
+        weights = numpy.concatenate(
+            [
+                numpy.full(len(items), 2**level)
+                for level, items in enumerate(self.levels)
+            ]
+        )
+        order = numpy.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def get_quantiles(self, quantiles) -> numpy.ndarray:
+        """Smallest retained value whose rank reaches each quantile, the
+        inverted cdf of the sketched distribution."""
+        if not self.count:
+            return numpy.full(numpy.shape(quantiles), numpy.nan)
+        values, weights = self.get_weighted_values()
+        ranks = numpy.cumsum(weights)
+        targets = numpy.asarray(quantiles, dtype=numpy.float64) * self.count
+        index = numpy.searchsorted(ranks, targets, side="left")
+        return values[numpy.clip(index, 0, len(values) - 1)]
+
+    def get_quantile(self, quantile: float) -> float:
+        return float(self.get_quantiles([quantile])[0])
+
+    def get_cdf(self, points) -> numpy.ndarray:
+        # estimated fraction of results at or below each point
+        if not self.count:
+            return numpy.full(numpy.shape(points), numpy.nan)
+        values, weights = self.get_weighted_values()
+        ranks = numpy.concatenate([[0], numpy.cumsum(weights)])
+        return ranks[numpy.searchsorted(values, points, side="right")] / self.count
+
+
+class StreamingHistogram:
+    """Counts of session results in at most max_bins equal bins. Bins are
+    aligned to multiples of a power of two times base_width, and the width
+    doubles, pairing up neighbouring bins, whenever the results spread over
+    more than max_bins. Counts stay exact at the current width, and
+    histograms merge after coarsening to the wider of the two."""
+
+    def __init__(self, max_bins: int = 64, base_width: float = 1.0):
+        if max_bins < 2:
+            raise ValueError("max_bins has to be at least 2")
+        self.max_bins = max_bins
+        self.width = base_width
+        self.start = 0
+        self.counts = numpy.zeros(0, dtype=numpy.int64)
+
+    def coarsen(self):
+        positions = (self.start + numpy.arange(len(self.counts))) // 2
+        self.start //= 2
+        self.counts = numpy.bincount(
+            positions - self.start, weights=self.counts
+        ).astype(numpy.int64)
+        self.width *= 2
+
+    def add_counts(self, start: int, counts: numpy.ndarray):
+        if not counts.any():
+            return
+        if self.counts.any():
+            low = min(self.start, start)
+            high = max(self.start + len(self.counts), start + len(counts))
+        else:
+            low, high = start, start + len(counts)
+        merged = numpy.zeros(high - low, dtype=numpy.int64)
+        merged[self.start - low : self.start - low + len(self.counts)] += self.counts
+        merged[start - low : start - low + len(counts)] += counts
+        self.start, self.counts = low, merged
+        # trimmed so only occupied bins count towards max_bins
+        occupied = numpy.flatnonzero(self.counts)
+        self.start += occupied[0]
+        self.counts = self.counts[occupied[0] : occupied[-1] + 1]
+        while len(self.counts) > self.max_bins:
+            self.coarsen()
+
+    def update(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        if not len(values):
+            return self
+        low = math.floor(values.min() / self.width)
+        high = math.floor(values.max() / self.width)
+        # coarsened first, so the bin counts never outgrow max_bins
+        while high - low + 1 > self.max_bins:
+            self.coarsen()
+            low, high = low // 2, high // 2
+        index = numpy.floor(values / self.width).astype(numpy.int64) - low
+        self.add_counts(low, numpy.bincount(index, minlength=high - low + 1))
+        return self
+
+    def merge(self, other: "StreamingHistogram"):
+        other_start, other_counts, other_width = other.start, other.counts, other.width
+        while self.width < other_width:
+            self.coarsen()
+        while other_width < self.width:
+            positions = (other_start + numpy.arange(len(other_counts))) // 2
+            other_start //= 2
+            other_counts = numpy.bincount(
+                positions - other_start, weights=other_counts
+            ).astype(numpy.int64)
+            other_width *= 2
+        self.add_counts(other_start, other_counts)
+        return self
+
+    def get_count(self):
+        return int(self.counts.sum())
+
+    def get_width(self):
+        return self.width
+
+    def get_bins(self):
+        """Returns (edges, counts), len(edges) == len(counts) + 1."""
+        edges = (self.start + numpy.arange(len(self.counts) + 1)) * self.width
+        return edges, self.counts.copy()
+
+
+class SessionSummary:
+    """Running stats, a quantile sketch, a histogram and the most extreme
+    results of the same sessions, everything the results page needs without
+    keeping the results. Its size does not depend on how many sessions were
+    summarized."""
+
+    def __init__(
+        self,
+        k: int = 200,
+        seed=None,
+        max_bins: int = 64,
+        num_extremes: int = 50,
+    ):
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch(k, seed)
+        self.histogram = StreamingHistogram(max_bins)
+        self.num_extremes = num_extremes
+        self.lowest = numpy.empty(0, dtype=numpy.float64)
+        self.highest = numpy.empty(0, dtype=numpy.float64)
+
+    def add_extremes(self, lowest, highest):
+        lowest = numpy.sort(numpy.concatenate([self.lowest, lowest]))
+        highest = numpy.sort(numpy.concatenate([self.highest, highest]))
+        self.lowest = lowest[: self.num_extremes]
+        self.highest = highest[max(0, len(highest) - self.num_extremes) :]
+
+    def update(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        self.stats.update(values)
+        self.sketch.update(values)
+        self.histogram.update(values)
+        self.add_extremes(values, values)
+        return self
+
+    def merge(self, other: "SessionSummary"):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+        self.add_extremes(other.lowest, other.highest)
+        return self
+
+    def scale(self, factor: float):
+        # results in units of the bet to results in dollars, say
+        if factor <= 0:
+            raise ValueError("Summaries can only be scaled by a positive factor")
+        self.stats.mean *= factor
+        self.stats.m2 *= factor**2
+        self.stats.min *= factor
+        self.stats.max *= factor
+        self.sketch.levels = [items * factor for items in self.sketch.levels]
+        self.histogram.width *= factor
+        self.lowest = self.lowest * factor
+        self.highest = self.highest * factor
+        return self
+
+    def get_stats(self) -> RunningStats:
+        return self.stats
+
+    def get_sketch(self) -> QuantileSketch:
+        return self.sketch
+
+    def get_histogram(self) -> StreamingHistogram:
+        return self.histogram
+
+    def get_count(self):
+        return self.stats.get_count()
+
+    def get_median(self):
+        return self.sketch.get_quantile(0.5)
+
+    def get_box(self) -> dict:
+        """Quartiles, whisker ends and outliers for a box plot. The whiskers
+        end at the most extreme results within 1.5 IQR of the box, and the
+        outliers are those beyond them among the num_extremes lowest and
+        highest results."""
+        q1, median, q3 = self.sketch.get_quantiles([0.25, 0.5, 0.75])
+        low_limit = q1 - 1.5 * (q3 - q1)
+        high_limit = q3 + 1.5 * (q3 - q1)
+        # exact when the kept extremes reach inside the whiskers, otherwise
+        # the nearest value the sketch retained
+        lowest = self.lowest[self.lowest >= low_limit]
+        if not len(lowest):
+            lowest = self.sketch.get_weighted_values()[0]
+            lowest = lowest[lowest >= low_limit]
+        lower_fence = lowest.min(initial=q1)
+        highest = self.highest[self.highest <= high_limit]
+        if not len(highest):
+            highest = self.sketch.get_weighted_values()[0]
+            highest = highest[highest <= high_limit]
+        upper_fence = highest.max(initial=q3)
+        outliers = numpy.concatenate(
+            [
+                self.lowest[self.lowest < lower_fence],
+                self.highest[self.highest > upper_fence],
+            ]
+        )
+        return {
+            "q1": float(q1),
+            "median": float(median),
+            "q3": float(q3),
+            "lowerfence": float(lower_fence),
+            "upperfence": float(upper_fence),
+            "mean": self.stats.get_mean(),
+            "outliers": outliers,
+        }
@@ -0,0 +1,341 @@
+import numpy
+
+from blackjack import (
+    ACE_VALUE,
+    BLACKJACK_RESULT,
+    BUST_RESULT,
+    DOUBLE_HIT_CODE,
+    DOUBLE_RESULT,
+    DOUBLE_STAND_CODE,
+    HARD_STATES,
+    HIT_CODE,
+    LIVE_RESULT,
+    MAX_HANDS,
+    NUM_DEALER_CARDS,
+    NUM_STATES,
+    PAIR_STATES,
+    SOFT_STATES,
+    SPLIT_CODE,
+    SPLIT_IF_DOUBLE_CODE,
+    STAND_CODE,
+    SURRENDER_HIT_CODE,
+    SURRENDER_RESULT,
+    SURRENDER_STAND_CODE,
+    Player,
+    new_shoe,
+)
+
+
+def card_points(cards: numpy.ndarray) -> numpy.ndarray:
+    # hard value of a card, aces count as 1
+    return numpy.where(cards == ACE_VALUE, 1, cards)
+
+
+class BatchEngine:
+    """Plays n_samples independent sessions in lockstep with numpy.
+
+    Every session has its own shoe, a row of a 2-D uint8 array dealt from the
+    back like Deck, and its own running count and profit. Each round is played
+    for all sessions at once: the player's hands and the dealer's draws are
+    loops of masked array operations over the sessions that still have a
+    decision to make, following the same rules and dealing order as play, so
+    a session dealt the same shoe as worker ends up with the same result.
+    """
+
+    def __init__(
+        self,
+        player: Player,
+        num_decks: int = 6,
+        n_samples: int = 100,
+        threshold: float = 0.35,
+        seed=None,
+        cards_in_a_deck: int = 52,
+    ):
+        assert isinstance(num_decks, int)
+        if n_samples < 1:
+            raise ValueError("Need at least one session")
+        counting_system = player.get_counting_system()
+        self.table = numpy.frombuffer(
+            player.compiled_policy.get_table(), dtype=numpy.uint8
+        )
+        self.betting_ramp = player.betting_ramp
+        self.tags = numpy.asarray(counting_system.get_tags(), dtype=numpy.float64)
+        self.counting_system = counting_system
+        self.initial_count = counting_system.get_initial_count(num_decks)
+        self.threshold = threshold
+        self.cards_in_a_deck = cards_in_a_deck
+        self.n_samples = n_samples
+
+        self.rng = numpy.random.default_rng(seed)
+        self.template = numpy.frombuffer(new_shoe(num_decks), dtype=numpy.uint8)
+        self.num_cards = len(self.template)
+        self.shoes = self.new_shoes(n_samples)
+        self.cards_left = numpy.full(n_samples, self.num_cards, dtype=numpy.int64)
+        self.count = numpy.full(n_samples, self.initial_count, dtype=numpy.float64)
+        self.profits = numpy.zeros(n_samples, dtype=numpy.float64)
+        self.num_reshuffles = numpy.zeros(n_samples, dtype=numpy.int64)
+        self.sessions = numpy.arange(n_samples)
+
+    def new_shoes(self, num_shoes: int) -> numpy.ndarray:
+        return self.rng.permuted(numpy.tile(self.template, (num_shoes, 1)), axis=1)
+
+    def load_shoes(self, shoes: numpy.ndarray):
+        shoes = numpy.asarray(shoes, dtype=numpy.uint8)
+        if shoes.shape != self.shoes.shape:
+            raise ValueError(
+                "Shoes must be an array of shape {}".format(self.shoes.shape)
+            )
+        self.shoes[:] = shoes
+        self.cards_left[:] = self.num_cards
+        self.count[:] = self.initial_count
+
+    def deal(self, sessions: numpy.ndarray) -> numpy.ndarray:
+        cards_left = self.cards_left[sessions] - 1
+        # a session that runs out of cards mid round wraps around its shoe
+        cards = self.shoes[sessions, cards_left % self.num_cards].astype(numpy.int64)
+        self.cards_left[sessions] = cards_left
+        self.count[sessions] += self.tags[cards]
+        return cards
+
+    def get_betting_counts(self) -> numpy.ndarray:
+        return self.counting_system.get_betting_count(
+            self.count, self.cards_left, self.cards_in_a_deck
+        )
+
+    def run(self, iterations: int) -> numpy.ndarray:
+        for _ in range(iterations):
+            self.play_round()
+        return self.profits.copy()
+
+    def play_round(self):
+        wagers = self.betting_ramp.get_wagers(self.get_betting_counts())
+        sessions = self.sessions
+        dealer_open, dealer_closed = self.deal(sessions), self.deal(sessions)
+        player_card1, player_card2 = self.deal(sessions), self.deal(sessions)
+        dealer_blackjack = dealer_open + dealer_closed == 21
+        player_blackjack = player_card1 + player_card2 == 21
+
+        # net result of the round in units of the wager
+        outcomes = numpy.zeros(self.n_samples, dtype=numpy.float64)
+        outcomes[dealer_blackjack & ~player_blackjack] = -1
+        outcomes[~dealer_blackjack & player_blackjack] = 1.5
+        playing = numpy.flatnonzero(~dealer_blackjack & ~player_blackjack)
+        if len(playing):
+            outcomes[playing] = self.play_hands(
+                playing,
+                player_card1[playing],
+                player_card2[playing],
+                dealer_open[playing],
+                dealer_closed[playing],
+            )
+        self.profits += outcomes * wagers
+        self.check_if_new_shoes()
+
+    def check_if_new_shoes(self):
+        reshuffle = numpy.flatnonzero(self.cards_left / self.num_cards < self.threshold)
+        if len(reshuffle):
+            self.shoes[reshuffle] = self.new_shoes(len(reshuffle))
+            self.cards_left[reshuffle] = self.num_cards
+            self.count[reshuffle] = self.initial_count
+            self.num_reshuffles[reshuffle] += 1
+
+    def play_hands(
+        self, sessions, player_card1, player_card2, dealer_open, dealer_closed
+    ):
+        num_sessions = len(sessions)
+        # the hand being played in each session
+        lower_bound = card_points(player_card1) + card_points(player_card2)
+        aces = (player_card1 == ACE_VALUE).astype(numpy.int64) + (
+            player_card2 == ACE_VALUE
+        )
+        num_cards = numpy.full(num_sessions, 2, dtype=numpy.int64)
+        duplicate = player_card1 == player_card2
+        num_hands = numpy.ones(num_sessions, dtype=numpy.int64)
+        in_hand = numpy.ones(num_sessions, dtype=bool)
+        # split hands waiting for their second card, as in RoundEngine
+        pending_cards = numpy.zeros((num_sessions, MAX_HANDS), dtype=numpy.int64)
+        pending_split_aces = numpy.zeros((num_sessions, MAX_HANDS), dtype=bool)
+        num_pending = numpy.zeros(num_sessions, dtype=numpy.int64)
+        result_codes = numpy.full((num_sessions, MAX_HANDS), -1, dtype=numpy.int64)
+        result_values = numpy.zeros((num_sessions, MAX_HANDS), dtype=numpy.int64)
+        num_results = numpy.zeros(num_sessions, dtype=numpy.int64)
+
+        def record(idx, code, values):
+            result_codes[idx, num_results[idx]] = code
+            result_values[idx, num_results[idx]] = values
+            num_results[idx] += 1
+
+        while True:
+            idx = numpy.flatnonzero(in_hand)
+            if not len(idx):
+                break
+            hand_lower = lower_bound[idx]
+            hand_aces = aces[idx] > 0
+            hand_duplicate = duplicate[idx]
+            more_than_two = num_cards[idx] > 2
+            upper_bound = hand_lower + 10 * hand_aces
+            best_value = numpy.where(upper_bound <= 21, upper_bound, hand_lower)
+
+            bust = hand_lower > 21
+            blackjack = ~bust & (upper_bound == 21) & (num_hands[idx] == 1)
+            blackjack &= ~more_than_two
+            decide = ~bust & ~blackjack
+
+            state = numpy.where(
+                hand_duplicate & (num_hands[idx] < 4),
+                PAIR_STATES + numpy.where(hand_aces, ACE_VALUE, hand_lower // 2),
+                numpy.where(
+                    hand_aces & (hand_lower <= 10) & ~hand_duplicate,
+                    SOFT_STATES + upper_bound,
+                    HARD_STATES + best_value,
+                ),
+            )
+            state = numpy.minimum(state, NUM_STATES - 1)
+            action = self.table[state * NUM_DEALER_CARDS + dealer_open[idx]]
+
+            stand = decide & (
+                (action == STAND_CODE)
+                | ((action == DOUBLE_STAND_CODE) & more_than_two)
+                | ((action == SURRENDER_STAND_CODE) & more_than_two)
+            )
+            hit = decide & (
+                (action == HIT_CODE)
+                | ((action == DOUBLE_HIT_CODE) & more_than_two)
+                | ((action == SURRENDER_HIT_CODE) & more_than_two)
+            )
+            split = decide & ((action == SPLIT_CODE) | (action == SPLIT_IF_DOUBLE_CODE))
+            double = (
+                decide
+                & ~more_than_two
+                & ((action == DOUBLE_STAND_CODE) | (action == DOUBLE_HIT_CODE))
+            )
+            surrender = decide & ~(stand | hit | split | double)
+
+            record(idx[bust], BUST_RESULT, best_value[bust])
+            record(idx[blackjack], BLACKJACK_RESULT, best_value[blackjack])
+            record(idx[stand], LIVE_RESULT, best_value[stand])
+            record(idx[surrender], SURRENDER_RESULT, best_value[surrender])
+
+            hitting = idx[hit]
+            if len(hitting):
+                new_cards = self.deal(sessions[hitting])
+                lower_bound[hitting] += card_points(new_cards)
+                aces[hitting] += new_cards == ACE_VALUE
+                num_cards[hitting] += 1
+                duplicate[hitting] = False
+
+            doubling = idx[double]
+            if len(doubling):
+                new_cards = self.deal(sessions[doubling])
+                doubling_aces = aces[doubling] > 0
+                new_upper = upper_bound[double] + numpy.where(
+                    new_cards == ACE_VALUE,
+                    numpy.where(doubling_aces, 1, 11),
+                    new_cards,
+                )
+                new_lower = lower_bound[doubling] + card_points(new_cards)
+                values = numpy.where(new_upper <= 21, new_upper, new_lower)
+                record(doubling[values <= 21], DOUBLE_RESULT, values[values <= 21])
+                record(doubling[values > 21], BUST_RESULT, values[values > 21])
+
+            splitting = idx[split]
+            if len(splitting):
+                num_hands[splitting] += 1
+                split_aces = aces[splitting] > 0
+                split_cards = numpy.where(
+                    split_aces, ACE_VALUE, lower_bound[splitting] // 2
+                )
+                for _ in range(2):
+                    pending_cards[splitting, num_pending[splitting]] = split_cards
+                    pending_split_aces[splitting, num_pending[splitting]] = split_aces
+                    num_pending[splitting] += 1
+
+            # every hand that did not hit is done, deal the next split hand
+            done = idx[~hit]
+            in_hand[done] = False
+            while True:
+                done = done[num_pending[done] > 0]
+                if not len(done):
+                    break
+                num_pending[done] -= 1
+                cards = pending_cards[done, num_pending[done]]
+                new_cards = self.deal(sessions[done])
+                split_aces_done = pending_split_aces[done, num_pending[done]] & (
+                    (new_cards != ACE_VALUE) | (num_hands[done] == 4)
+                )
+                record(
+                    done[split_aces_done],
+                    LIVE_RESULT,
+                    ACE_VALUE + card_points(new_cards[split_aces_done]),
+                )
+                starting = done[~split_aces_done]
+                cards = cards[~split_aces_done]
+                new_cards = new_cards[~split_aces_done]
+                lower_bound[starting] = card_points(cards) + card_points(new_cards)
+                aces[starting] = (cards == ACE_VALUE).astype(numpy.int64) + (
+                    new_cards == ACE_VALUE
+                )
+                num_cards[starting] = 2
+                duplicate[starting] = cards == new_cards
+                in_hand[starting] = True
+                done = done[split_aces_done]
+
+        if (result_codes == BLACKJACK_RESULT).any():
+            raise Exception("There is a bug here")
+        surrenders = (result_codes == SURRENDER_RESULT).sum(axis=1)
+        busts = (result_codes == BUST_RESULT).sum(axis=1)
+        outcomes = -(surrenders * 0.5 + busts).astype(numpy.float64)
+
+        live = (result_codes == LIVE_RESULT) | (result_codes == DOUBLE_RESULT)
+        showdown = numpy.flatnonzero(live.any(axis=1))
+        if len(showdown):
+            dealer_values = self.resolve_dealer_values(
+                sessions[showdown], dealer_open[showdown], dealer_closed[showdown]
+            )[:, None]
+            values = result_values[showdown]
+            live = live[showdown]
+            multipliers = numpy.where(result_codes[showdown] == DOUBLE_RESULT, 2, 1)
+            wins = live & ((values > dealer_values) | (dealer_values > 21))
+            losses = live & ~wins & (values < dealer_values)
+            outcomes[showdown] += (multipliers * wins).sum(axis=1)
+            outcomes[showdown] -= (multipliers * losses).sum(axis=1)
+        return outcomes
+
+    def resolve_dealer_values(self, sessions, dealer_open, dealer_closed):
+        lower_bound = card_points(dealer_open) + card_points(dealer_closed)
+        aces = (dealer_open == ACE_VALUE) | (dealer_closed == ACE_VALUE)
+        while True:
+            upper_bound = lower_bound + 10 * aces
+            dealer_values = numpy.where(upper_bound > 21, lower_bound, upper_bound)
+            # hits soft 17
+            drawing = numpy.flatnonzero(
+                (dealer_values < 17) | ((upper_bound == 17) & aces)
+            )
+            if not len(drawing):
+                return dealer_values
+            new_cards = self.deal(sessions[drawing])
+            lower_bound[drawing] += card_points(new_cards)
+            aces[drawing] |= new_cards == ACE_VALUE
+
+    def get_num_reshuffles(self):
+        return self.num_reshuffles.copy()
+
+
+def simulate_sessions(
+    player: Player,
+    num_decks: int = 6,
+    iterations: int = 1000,
+    n_samples: int = 100,
+    threshold: float = 0.35,
+    seed=None,
+) -> numpy.ndarray:
+    """Same per session profits as parallel_processing, from one lockstep
+    BatchEngine instead of a Python level session per task."""
+    engine = BatchEngine(
+        player,
+        num_decks=num_decks,
+        n_samples=n_samples,
+        threshold=threshold,
+        seed=seed,
+    )
+    return engine.run(iterations)
@@ -4,11 +4,19 @@ import random
 import bisect
 import math
 import copy
-from multiprocessing import Pool
+import functools
+import atexit
+import os
+from contextlib import closing
+from fractions import Fraction
+from multiprocessing import Pool, shared_memory
 
 import numpy
 from aenum import Enum, NoAlias
 
+from accumulators import SessionSummary
+from counting import CountingSystem, HI_LO
+
 
 class Cards(int, Enum, settings=NoAlias):
     TWO = 2
@@ -65,6 +73,11 @@ class DealerResultTypes(str, Enum):
     LIVE = "LIVE"
 
 
+class ShoeTypes(str, Enum):
+    SHOE = "SHOE"
+    CSM = "CSM"
+
+
 CARD_IDX = 0
 SUIT_IDX = 1
 
@@ -73,60 +86,220 @@ VALUE_IDX = 1
 
 WAGER_IDX = 0
 COUNT_RANGE_IDX = 1
+MAX_RAMP_SCALE = 1000
+
+ACE_VALUE = Cards.ACE.value
+UNIFORM_BLOCK_SIZE = 4096
+
+# small int codes for Actions, what the engine branches on
+HIT_CODE = 0
+STAND_CODE = 1
+SPLIT_CODE = 2
+SPLIT_IF_DOUBLE_CODE = 3
+DOUBLE_STAND_CODE = 4
+DOUBLE_HIT_CODE = 5
+SURRENDER_HIT_CODE = 6
+SURRENDER_STAND_CODE = 7
+SURRENDER_SPLIT_CODE = 8
+ACTION_CODES = {
+    Actions.HIT: HIT_CODE,
+    Actions.STAND: STAND_CODE,
+    Actions.SPLIT: SPLIT_CODE,
+    Actions.SPLIT_IF_DOUBLE: SPLIT_IF_DOUBLE_CODE,
+    Actions.DOUBLE_STAND: DOUBLE_STAND_CODE,
+    Actions.DOUBLE_HIT: DOUBLE_HIT_CODE,
+    Actions.SURRENDER_HIT: SURRENDER_HIT_CODE,
+    Actions.SURRENDER_STAND: SURRENDER_STAND_CODE,
+    Actions.SURRENDER_SPLIT: SURRENDER_SPLIT_CODE,
+}
+CODE_ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+
+# result codes the round engine writes for each of the player's hands
+LIVE_RESULT = 0
+BUST_RESULT = 1
+BLACKJACK_RESULT = 2
+SURRENDER_RESULT = 3
+DOUBLE_RESULT = 4
+RESULT_TYPES = {
+    LIVE_RESULT: PlayerResultTypes.LIVE,
+    BUST_RESULT: PlayerResultTypes.BUST,
+    BLACKJACK_RESULT: PlayerResultTypes.BLACKJACK,
+    SURRENDER_RESULT: PlayerResultTypes.SURRENDER,
+    DOUBLE_RESULT: PlayerResultTypes.DOUBLE,
+}
+MAX_HANDS = 4
+
+# compiled policy rows: hard totals 0-31 (a hand can be hit at 21), then
+# soft totals 0-31, then pairs by card value. columns are the dealer card
+HARD_STATES = 0
+SOFT_STATES = 32
+PAIR_STATES = 64
+NUM_STATES = PAIR_STATES + ACE_VALUE + 1
+NUM_DEALER_CARDS = ACE_VALUE + 1
+# composition vectors have one slot per card value, 2 through ace
+LOWEST_CARD_VALUE = Cards.TWO.value
+NUM_CARD_VALUES = ACE_VALUE - LOWEST_CARD_VALUE + 1
+
+
+@functools.lru_cache(maxsize=None)
+def new_shoe(num_decks: int) -> bytes:
+    # unshuffled shoe of card values, in the same order Deck always built it
+    cards = []
+    for _ in range(num_decks):
+        for _ in Suits:
+            for card in Cards:
+                cards.append(card.value)
+    return bytes(cards)
+
+
+def get_composition(cards) -> List[int]:
+    return [
+        cards.count(value)
+        for value in range(LOWEST_CARD_VALUE, LOWEST_CARD_VALUE + NUM_CARD_VALUES)
+    ]
 
 
-class Deck:
+class ShoeFactory:
+    """Shuffles shoes a block at a time. Each refill permutes block_size
+    copies of the unshuffled shoe, as rows of a 2-D uint8 array, in one
+    vectorized Generator.permuted call, and next_shoe hands the rows out
+    one by one."""
+
+    def __init__(self, num_decks: int = 6, block_size: int = 64, seed=None):
+        assert isinstance(num_decks, int)
+        if block_size < 1:
+            raise ValueError("Need to make at least one shoe per block")
+        self.num_decks = num_decks
+        self.block_size = block_size
+        self.rng = numpy.random.default_rng(seed)
+        self.template = numpy.frombuffer(new_shoe(num_decks), dtype=numpy.uint8)
+        self.block = None
+        self.next_row = block_size
+
+    def refill(self):
+        self.block = self.rng.permuted(
+            numpy.tile(self.template, (self.block_size, 1)), axis=1
+        )
+        self.next_row = 0
 
-    num_times_created = 0
+    def next_shoe(self) -> bytes:
+        if self.next_row == self.block_size:
+            self.refill()
+        shoe = self.block[self.next_row].tobytes()
+        self.next_row += 1
+        return shoe
 
-    def __init__(self, num_decks: int = 1, cards_in_a_deck=52):
+    def get_num_decks(self):
+        return self.num_decks
+
+
+class Deck:
+    def __init__(
+        self,
+        num_decks: int = 1,
+        cards_in_a_deck=52,
+        counting_system: CountingSystem = HI_LO,
+        shoe_factory: ShoeFactory = None,
+    ):
         assert isinstance(num_decks, int)
         if num_decks < 1:
             raise ValueError("Need to make at least one deck")
-
-        cards = []
-        for _ in range(num_decks):
-            for _ in Suits:
-                for card in Cards:
-                    cards.append(card)
-
-        n = len(cards)
-        self.cards_left = n
-        self.cards = cards
-        self.count = 0
+        if shoe_factory is not None and shoe_factory.get_num_decks() != num_decks:
+            raise ValueError("Shoe factory makes a different number of decks")
+
+        # the shoe is a bytearray of card values (2-11, ace is 11) and
+        # cards_left doubles as the cursor, so dealing never pops or
+        # touches an enum member
+        self.cards = bytearray(new_shoe(num_decks))
+        self.cards_left = len(self.cards)
+        self.counting_system = counting_system
+        self.tags = counting_system.get_tags()
+        self.count = counting_system.get_initial_count(num_decks)
         self.num_decks = num_decks
         self.cards_in_a_deck = cards_in_a_deck
-        self.shuffle()
+        self.num_reshuffles = 0
+        self.shoe_factory = shoe_factory
+        if shoe_factory is not None:
+            self.cards[:] = shoe_factory.next_shoe()
+        else:
+            self.shuffle()
+        self.reset_composition()
 
     def deal(self):
-        if len(self.get_cards()) == 0:
+        if self.cards_left == 0:
             return -1
         else:
-            new_card = self.get_cards().pop()
             self.cards_left -= 1
-            self.count_card(new_card)
+            new_card = self.cards[self.cards_left]
+            self.count += self.tags[new_card]
+            self.remaining[new_card - LOWEST_CARD_VALUE] -= 1
             return new_card
 
+    # cards stay in the discard tray until the cut card comes out
+    def end_round(self):
+        pass
+
+    # remaining holds how many of each card value (2 through ace) are left
+    # to deal, full_composition what the shoe started with
+    def reset_composition(self):
+        self.remaining = get_composition(self.cards[: self.cards_left])
+        self.full_composition = self.remaining.copy()
+
     def count_card(self, card):
-        if card in [Cards.ACE, Cards.KING, Cards.QUEEN, Cards.JACK, Cards.TEN]:
-            self.count -= 1
-        if card in [Cards.TWO, Cards.THREE, Cards.FOUR, Cards.FIVE, Cards.SIX]:
-            self.count += 1
+        self.count += self.tags[card]
 
     def shuffle(self):
-        random.shuffle(self.get_cards())
+        remaining = self.cards[: self.cards_left]
+        random.shuffle(remaining)
+        self.cards[: self.cards_left] = remaining
+
+    # puts every card back into the existing buffer and shuffles, instead of
+    # building a new Deck at the cut card
+    def reshuffle(self, num_decks: int = None):
+        if num_decks is not None:
+            self.set_num_decks(num_decks)
+        if self.shoe_factory is not None:
+            if self.shoe_factory.get_num_decks() != self.get_num_decks():
+                raise ValueError("Shoe factory makes a different number of decks")
+            self.cards[:] = self.shoe_factory.next_shoe()
+        else:
+            self.cards[:] = new_shoe(self.get_num_decks())
+        self.set_cards_left(len(self.cards))
+        self.set_count(self.counting_system.get_initial_count(self.get_num_decks()))
+        if self.shoe_factory is None:
+            self.shuffle()
+        self.reset_composition()
+        self.num_reshuffles += 1
 
     def check_threshhold(self, threshold):
         return (
             self.get_cards_left() / (self.get_cards_in_a_deck() * self.get_num_decks())
         ) < threshold
 
+    # a copy that plays on independently of this deck. given the cards dealt
+    # so far the undealt ones are in uniformly random order, so the copy
+    # reshuffles them and gets its own stream of future shoes
+    def branch(self, seed=None):
+        shuffle_seed, factory_seed = numpy.random.SeedSequence(seed).spawn(2)
+        deck = copy.copy(self)
+        deck.cards = bytearray(self.cards)
+        undealt = numpy.frombuffer(bytes(self.cards[: self.cards_left]), numpy.uint8)
+        rng = numpy.random.default_rng(shuffle_seed)
+        deck.cards[: self.cards_left] = rng.permutation(undealt).tobytes()
+        deck.remaining = self.remaining.copy()
+        deck.full_composition = self.full_composition.copy()
+        if self.shoe_factory is not None:
+            deck.shoe_factory = ShoeFactory(
+                self.num_decks, self.shoe_factory.block_size, factory_seed
+            )
+        return deck
+
     # getters
     def get_cards_left(self):
         return self.cards_left
 
     def get_cards(self):
-        return self.cards
+        return list(self.cards[: self.cards_left])
 
     def get_cards_in_a_deck(self):
         return self.cards_in_a_deck
@@ -137,8 +310,40 @@ class Deck:
     def get_num_decks(self):
         return self.num_decks
 
-    def get_true_count(self):
-        return self.get_count() / (self.get_cards_left() / self.get_cards_in_a_deck())
+    def get_decks_remaining(self):
+        return self.get_cards_left() / self.get_cards_in_a_deck()
+
+    def get_composition(self):
+        return self.remaining.copy()
+
+    def get_rank_probabilities(self):
+        cards_left = self.get_cards_left()
+        return [remaining / cards_left for remaining in self.remaining]
+
+    # running count of any counting system, from the cards dealt so far
+    def get_running_count(self, counting_system: CountingSystem = None):
+        if counting_system is None:
+            return self.get_count()
+        tags = counting_system.get_tags()
+        count = counting_system.get_initial_count(self.get_num_decks())
+        for idx in range(NUM_CARD_VALUES):
+            dealt = self.full_composition[idx] - self.remaining[idx]
+            count += tags[idx + LOWEST_CARD_VALUE] * dealt
+        return count
+
+    def get_true_count(self, counting_system: CountingSystem = None):
+        return self.get_running_count(counting_system) / self.get_decks_remaining()
+
+    def get_betting_count(self):
+        return self.counting_system.get_betting_count(
+            self.get_count(), self.get_cards_left(), self.get_cards_in_a_deck()
+        )
+
+    def get_counting_system(self):
+        return self.counting_system
+
+    def get_num_reshuffles(self):
+        return self.num_reshuffles
 
     # setters
     def set_cards_left(self, num_cards: int):
@@ -146,15 +351,16 @@ class Deck:
         assert num_cards >= 0
         self.cards_left = num_cards
 
-    def set_cards(self, cards: List[Tuple["Cards", "Suits"]]):
-        self.cards = cards
+    def set_cards(self, cards: List[int]):
+        self.cards = bytearray(cards)
         cards_left = len(cards)
         self.set_cards_left(cards_left)
-        self.set_count(0)
         self.set_num_decks(math.ceil(cards_left / 52))
+        self.set_count(self.counting_system.get_initial_count(self.get_num_decks()))
+        self.reset_composition()
 
-    def set_count(self, count: int):
-        assert isinstance(count, int)
+    def set_count(self, count: float):
+        assert isinstance(count, (int, float))
         self.count = count
 
     def set_num_decks(self, num_decks: int):
@@ -162,21 +368,151 @@ class Deck:
         self.num_decks = num_decks
 
 
+class ContinuousShuffler(Deck):
+    """Continuous shuffling machine. Cards are drawn by sampling a value from
+    the remaining composition, and the round's discards go back into the
+    machine in bulk at end_round, so there is no cut card and no shuffle."""
+
+    def __init__(
+        self,
+        num_decks: int = 1,
+        cards_in_a_deck=52,
+        counting_system: CountingSystem = HI_LO,
+        seed=None,
+    ):
+        assert isinstance(num_decks, int)
+        if num_decks < 1:
+            raise ValueError("Need to make at least one deck")
+
+        self.counting_system = counting_system
+        self.tags = counting_system.get_tags()
+        self.num_decks = num_decks
+        self.cards_in_a_deck = cards_in_a_deck
+        self.num_reshuffles = 0
+        self.shoe_factory = None
+        self.rng = numpy.random.default_rng(seed)
+        self.uniforms = []
+        self.next_uniform = 0
+        self.set_cards(new_shoe(num_decks))
+
+    def deal(self):
+        if self.cards_left == 0:
+            return -1
+        if self.next_uniform == len(self.uniforms):
+            self.uniforms = self.rng.random(UNIFORM_BLOCK_SIZE).tolist()
+            self.next_uniform = 0
+        target = min(
+            int(self.uniforms[self.next_uniform] * self.cards_left),
+            self.cards_left - 1,
+        )
+        self.next_uniform += 1
+
+        remaining = self.remaining
+        idx = 0
+        while target >= remaining[idx]:
+            target -= remaining[idx]
+            idx += 1
+        remaining[idx] -= 1
+        self.cards_left -= 1
+        new_card = idx + LOWEST_CARD_VALUE
+        self.count += self.tags[new_card]
+        return new_card
+
+    def end_round(self):
+        self.remaining[:] = self.full_composition
+        self.cards_left = self.total_cards
+        self.count = self.counting_system.get_initial_count(self.get_num_decks())
+
+    def shuffle(self):
+        pass
+
+    def reshuffle(self, num_decks: int = None):
+        if num_decks is not None and num_decks != self.get_num_decks():
+            self.set_cards(new_shoe(num_decks))
+        self.end_round()
+
+    def check_threshhold(self, threshold):
+        return False
+
+    def branch(self, seed=None):
+        deck = copy.copy(self)
+        deck.remaining = self.remaining.copy()
+        deck.full_composition = self.full_composition.copy()
+        deck.rng = numpy.random.default_rng(seed)
+        deck.uniforms = []
+        deck.next_uniform = 0
+        return deck
+
+    def get_cards(self):
+        cards = []
+        for idx, remaining in enumerate(self.remaining):
+            cards += [idx + LOWEST_CARD_VALUE] * remaining
+        return cards
+
+    def set_cards(self, cards: List[int]):
+        self.remaining = get_composition(bytes(cards))
+        self.full_composition = self.remaining.copy()
+        self.total_cards = len(cards)
+        self.set_cards_left(self.total_cards)
+        self.set_num_decks(math.ceil(self.total_cards / 52))
+        self.set_count(self.counting_system.get_initial_count(self.get_num_decks()))
+
+
+def make_deck(
+    shoe_type: ShoeTypes,
+    num_decks: int,
+    counting_system: CountingSystem = HI_LO,
+    seed=None,
+):
+    if shoe_type == ShoeTypes.CSM:
+        return ContinuousShuffler(num_decks, counting_system=counting_system, seed=seed)
+    if shoe_type == ShoeTypes.SHOE:
+        return Deck(
+            num_decks,
+            counting_system=counting_system,
+            shoe_factory=ShoeFactory(num_decks, seed=seed),
+        )
+    raise ValueError("Unknown shoe type {}".format(shoe_type))
+
+
 class Hand:
+    # totals are kept up to date as cards come in, so parsing a hand never
+    # walks its cards
+    __slots__ = ("cards", "num_cards", "aces", "lower_bound", "all_same")
+
     def __init__(self, cards: List["Cards"], num_cards: int = 2):
         self.cards = cards
         self.num_cards = num_cards
+        self.update_totals()
+
+    def update_totals(self):
+        self.aces = 0
+        self.lower_bound = 0
+        for card in self.cards:
+            if card == ACE_VALUE:
+                self.aces += 1
+                self.lower_bound += 1
+            else:
+                self.lower_bound += card
+        self.all_same = len(set(self.cards)) == 1
 
     def add_card(self, card: "Card"):
-        self.cards += [card]
-        self.set_num_cards(self.get_num_cards() + 1)
+        self.all_same = self.all_same and card == self.cards[0]
+        self.cards.append(card)
+        self.num_cards += 1
+        if card == ACE_VALUE:
+            self.aces += 1
+            self.lower_bound += 1
+        else:
+            self.lower_bound += card
 
     def delete_card(self, card: "Card"):
         self.cards.remove(card)
         self.set_num_cards(self.get_num_cards() - 1)
+        self.update_totals()
 
     def is_duplicate(self):
-        return len(set(self.get_cards())) == 1 and self.get_num_cards() == 2
+        return self.all_same and self.num_cards == 2
 
     def get_cards(self):
         return self.cards
@@ -184,8 +520,9 @@ class Hand:
     def get_num_cards(self):
         return self.num_cards
 
-    def set_cards(self, cards: Set["Cards"]):
+    def set_cards(self, cards: List["Cards"]):
         self.cards = cards
+        self.update_totals()
 
     def set_num_cards(self, num_cards: int):
         assert isinstance(num_cards, int)
@@ -194,24 +531,14 @@ class Hand:
 
     # returns number of aces, lower bound, upper bound
     def get_sum(self):
-        lower_bound = 0
-        upper_bound = 0
-        aces = 0
-        for card in self.cards:
-            if card == Cards.ACE:
-                aces += 1
-                lower_bound += 1
-                upper_bound += 11 if aces == 1 else 1
-            else:
-                lower_bound += card.value
-                upper_bound += card.value
-
-        return aces, lower_bound, upper_bound
+        if self.aces:
+            return self.aces, self.lower_bound, self.lower_bound + 10
+        return 0, self.lower_bound, self.lower_bound
 
     def parse_hand(self):
         aces, lower_bound, upper_bound = self.get_sum()
 
-        if (self.get_num_cards() == 2) and self.is_duplicate():
+        if self.all_same and self.num_cards == 2:
             return HandTypes.DUPLICATE, aces, lower_bound, upper_bound
         if aces > 0:
             return HandTypes.SOFT, aces, lower_bound, upper_bound
@@ -219,6 +546,166 @@ class Hand:
             return HandTypes.HARD, aces, lower_bound, upper_bound
 
 
+def lookup_policy(policy: Dict[int, Dict[int, "Action"]], value: int, dealer_card):
+    # reads a policy the way the defaultdicts in simulator.py would answer,
+    # without inserting the missing keys. unspecified states stand
+    def get(table, key):
+        if key in table:
+            return table[key]
+        default_factory = getattr(table, "default_factory", None)
+        return default_factory() if default_factory is not None else None
+
+    row = get(policy, value)
+    action = get(row, dealer_card) if row is not None else None
+    return Actions.STAND if action is None else action
+
+
+class CompiledPolicy:
+    """Hard, soft and split policies compiled to one flat table of action
+    codes, indexed by hand state * NUM_DEALER_CARDS + dealer card."""
+
+    def __init__(self, table: bytes):
+        if len(table) != NUM_STATES * NUM_DEALER_CARDS:
+            raise ValueError("Compiled policy table has the wrong size")
+        self.table = bytes(table)
+
+    @classmethod
+    def from_policies(
+        cls,
+        hard_policy: Dict[int, Dict[int, "Action"]],
+        soft_policy: Dict[int, Dict[int, "Action"]],
+        split_policy: Dict[int, Dict[int, "Action"]],
+    ):
+        table = bytearray(NUM_STATES * NUM_DEALER_CARDS)
+        for offset, policy, num_values in [
+            (HARD_STATES, hard_policy, SOFT_STATES - HARD_STATES),
+            (SOFT_STATES, soft_policy, PAIR_STATES - SOFT_STATES),
+            (PAIR_STATES, split_policy, NUM_STATES - PAIR_STATES),
+        ]:
+            for value in range(num_values):
+                for dealer_card in range(NUM_DEALER_CARDS):
+                    action = lookup_policy(policy, value, dealer_card)
+                    table[(offset + value) * NUM_DEALER_CARDS + dealer_card] = (
+                        ACTION_CODES[action]
+                    )
+        return cls(bytes(table))
+
+    @staticmethod
+    def get_state(aces, lower_bound, duplicate, can_split):
+        if duplicate and can_split:
+            # a pair of aces has a lower bound of 2
+            return PAIR_STATES + (ACE_VALUE if aces else lower_bound // 2)
+        if aces and lower_bound <= 10 and not duplicate:
+            return SOFT_STATES + lower_bound + 10
+        if aces and lower_bound <= 11:
+            return HARD_STATES + lower_bound + 10
+        return HARD_STATES + lower_bound
+
+    def get_code(self, state: int, dealer_card: int):
+        return self.table[state * NUM_DEALER_CARDS + dealer_card]
+
+    def get_table(self):
+        return self.table
+
+    def __eq__(self, other):
+        return isinstance(other, CompiledPolicy) and self.table == other.table
+
+    def __hash__(self):
+        return hash(self.table)
+
+
+def bisect_wager(betting_policy: Tuple[List[int], List[int]], count):
+    if count > 0:
+        return betting_policy[WAGER_IDX][
+            bisect.bisect(betting_policy[COUNT_RANGE_IDX], count)
+        ]
+    if count < 0:
+        return betting_policy[WAGER_IDX][
+            bisect.bisect_left(betting_policy[COUNT_RANGE_IDX], count)
+        ]
+    else:
+        return betting_policy[WAGER_IDX][
+            bisect.bisect(betting_policy[COUNT_RANGE_IDX], count) - 1
+        ]
+
+
+class BettingRamp:
+    """A betting policy compiled to a lookup table over a grid of count cells.
+
+    The grid step is 1 / scale, where scale is the smallest integer that puts
+    every count range on a grid line, so the wager is constant inside a cell
+    and each cell is filled in with bisect_wager. Counts landing exactly on a
+    range (or on 0, which bisect_wager treats on its own) are looked up in a
+    small dict. Counts off either end of the grid are clamped to the end
+    cells. Ranges too fine grained for a table of MAX_RAMP_SCALE cells per
+    count are not compiled, and every count goes through bisect_wager.
+    """
+
+    def __init__(self, betting_policy: Tuple[List[int], List[int]]):
+        wager_amts, ranges = betting_policy
+        if len(wager_amts) < len(ranges) + 1:
+            raise ValueError("Need one more wager than count ranges")
+        scale = 1
+        for value in ranges:
+            denominator = Fraction(str(value)).denominator
+            scale = scale * denominator // math.gcd(scale, denominator)
+        self.betting_policy = betting_policy
+        if scale > MAX_RAMP_SCALE:
+            self.table = None
+            return
+
+        low = round(min(ranges, default=0) * scale)
+        high = round(max(ranges, default=0) * scale)
+        self.scale = scale
+        # cell 0 holds everything below the lowest range, cell i the counts
+        # in [(low + i - 1) / scale, (low + i) / scale)
+        self.offset = low - 1
+        self.table = [
+            bisect_wager(betting_policy, (self.offset + cell + 0.5) / scale)
+            for cell in range(high - low + 2)
+        ]
+        self.last_cell = len(self.table) - 1
+        self.exact = {
+            value: bisect_wager(betting_policy, value) for value in list(ranges) + [0]
+        }
+
+    def get_wager(self, count):
+        if self.table is None:
+            return bisect_wager(self.betting_policy, count)
+        wager = self.exact.get(count)
+        if wager is not None:
+            return wager
+        cell = int(count * self.scale - self.offset)
+        if cell < 0:
+            return self.table[0]
+        if cell > self.last_cell:
+            return self.table[self.last_cell]
+        return self.table[cell]
+
+    def get_wagers(self, counts: numpy.ndarray) -> numpy.ndarray:
+        counts = numpy.asarray(counts, dtype=numpy.float64)
+        if self.table is None:
+            return self.bisect_wagers(counts)
+        cells = numpy.floor(counts * self.scale - self.offset)
+        cells = numpy.clip(cells, 0, self.last_cell).astype(numpy.intp)
+        wagers = numpy.asarray(self.table, dtype=numpy.float64)[cells]
+        for value, wager in self.exact.items():
+            wagers[counts == value] = wager
+        return wagers
+
+    def bisect_wagers(self, counts: numpy.ndarray) -> numpy.ndarray:
+        # bisect_wager over an array of counts
+        wager_amts, ranges = self.betting_policy
+        ranges = numpy.asarray(ranges, dtype=numpy.float64)
+        right = numpy.searchsorted(ranges, counts, side="right")
+        left = numpy.searchsorted(ranges, counts, side="left")
+        index = numpy.where(counts > 0, right, numpy.where(counts < 0, left, right - 1))
+        return numpy.asarray(wager_amts, dtype=numpy.float64)[index]
+
+    def get_betting_policy(self):
+        return self.betting_policy
+
+
 class Player:
 
     # when you implement more than 1 player, have a class variable bankroll and have 2 players
@@ -231,6 +718,8 @@ class Player:
         split_policy: Dict[int, Dict[int, "Action"]],
         betting_policy: Tuple[List[int], List[int]],
         num_hands: int = 0,
+        counting_system: CountingSystem = HI_LO,
+        compiled_policy: CompiledPolicy = None,
     ):
         self.bankroll = bankroll
         self.hard_policy = hard_policy
@@ -238,6 +727,44 @@ class Player:
         self.split_policy = split_policy
         self.betting_policy = betting_policy
         self.num_hands = num_hands
+        self.counting_system = counting_system
+        # the policies are compiled once here, later changes to the dicts are
+        # not picked up
+        if compiled_policy is None:
+            compiled_policy = CompiledPolicy.from_policies(
+                hard_policy, soft_policy, split_policy
+            )
+        self.compiled_policy = compiled_policy
+        self.action_table = compiled_policy.get_table()
+        self.betting_ramp = BettingRamp(betting_policy)
+        self.round_engine = RoundEngine()
+
+    # only the compiled policy is sent to pool workers, not the dicts
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["hard_policy"] = None
+        state["soft_policy"] = None
+        state["split_policy"] = None
+        return state
+
+    # a player without the policy dicts, as rebuilt inside pool workers
+    @classmethod
+    def from_compiled(
+        cls,
+        bankroll: int,
+        compiled_policy: CompiledPolicy,
+        betting_policy: Tuple[List[int], List[int]],
+        counting_system: CountingSystem = HI_LO,
+    ):
+        return cls(
+            bankroll=bankroll,
+            hard_policy=None,
+            soft_policy=None,
+            split_policy=None,
+            betting_policy=betting_policy,
+            counting_system=counting_system,
+            compiled_policy=compiled_policy,
+        )
 
     def copy(self):
         return Player(
@@ -247,44 +774,26 @@ class Player:
             split_policy=copy.copy(self.split_policy),
             betting_policy=copy.copy(self.betting_policy),
             num_hands=copy.copy(self.num_hands),
+            counting_system=self.counting_system,
+            compiled_policy=self.compiled_policy,
         )
 
+    def get_action_code(self, hand: "Hand", dealer_card: int):
+        duplicate = hand.all_same and hand.num_cards == 2
+        state = CompiledPolicy.get_state(
+            hand.aces, hand.lower_bound, duplicate, self.num_hands < 4
+        )
+        return self.action_table[state * NUM_DEALER_CARDS + dealer_card]
+
     def get_action(self, hand: "Hand", dealer_card: "Card"):
         hand_type, aces, lower_bound, upper_bound = hand.parse_hand()
-        value = lower_bound if upper_bound > 21 else upper_bound
-        dealer_card_value = dealer_card.value
-        if hand_type == HandTypes.DUPLICATE and self.get_num_hands() < 4:
-            if aces > 0:
-                return (
-                    self.split_policy[Cards.ACE.value][dealer_card_value],
-                    hand_type,
-                    aces,
-                    lower_bound,
-                    upper_bound,
-                )
-            return (
-                self.split_policy[upper_bound // 2][dealer_card_value],
-                hand_type,
-                aces,
-                lower_bound,
-                upper_bound,
-            )
-        if hand_type == HandTypes.SOFT and lower_bound <= 10:
-            return (
-                self.soft_policy[value][dealer_card_value],
-                hand_type,
-                aces,
-                lower_bound,
-                upper_bound,
-            )
-        else:
-            return (
-                self.hard_policy[value][dealer_card_value],
-                hand_type,
-                aces,
-                lower_bound,
-                upper_bound,
-            )
+        return (
+            CODE_ACTIONS[self.get_action_code(hand, int(dealer_card))],
+            hand_type,
+            aces,
+            lower_bound,
+            upper_bound,
+        )
 
     def increment_num_hands(self):
         self.num_hands += 1
@@ -301,92 +810,181 @@ class Player:
     def get_bankroll(self):
         return self.bankroll
 
+    def get_counting_system(self):
+        return self.counting_system
+
+    # count is the betting count of the counting system, the true count for
+    # balanced systems and the running count for unbalanced ones
     def calculate_wager(self, count):
-        if count > 0:
-            return self.betting_policy[WAGER_IDX][
-                bisect.bisect(self.betting_policy[COUNT_RANGE_IDX], count)
-            ]
-        if count < 0:
-            return self.betting_policy[WAGER_IDX][
-                bisect.bisect_left(self.betting_policy[COUNT_RANGE_IDX], count)
-            ]
-        else:
-            return self.betting_policy[WAGER_IDX][
-                bisect.bisect(self.betting_policy[COUNT_RANGE_IDX], count) - 1
-            ]
+        return self.betting_ramp.get_wager(count)
 
 
-def resolve_player_action(hand: "Hand", dealer_card: "Card", player: Player, deck):
+class RoundEngine:
+    """Plays out the player's hands without recursion. Split hands waiting for
+    their second card sit on a fixed size stack, and each finished hand writes
+    a result code and value into preallocated buffers."""
 
-    action, hand_type, aces, lower_bound, upper_bound = player.get_action(
-        hand, dealer_card
+    __slots__ = (
+        "result_codes",
+        "result_values",
+        "pending_cards",
+        "pending_split_aces",
     )
-    num_cards = hand.get_num_cards()
-    best_value = upper_bound if upper_bound <= 21 else lower_bound
-
-    if upper_bound > 21 and lower_bound > 21:
-        return [(PlayerResultTypes.BUST, best_value)]
-    if upper_bound == 21 and player.get_num_hands() == 1 and hand.get_num_cards() == 2:
-        return [(PlayerResultTypes.BLACKJACK, best_value)]
-    if (
-        action == Actions.STAND
-        or (action == Actions.DOUBLE_STAND and num_cards > 2)
-        or (action == Actions.SURRENDER_STAND and num_cards > 2)
-    ):
-        return [(PlayerResultTypes.LIVE, best_value)]
-    if (
-        action == Actions.HIT
-        or (action == Actions.DOUBLE_HIT and num_cards > 2)
-        or (action == Actions.SURRENDER_HIT and num_cards > 2)
+
+    def __init__(self):
+        self.result_codes = [LIVE_RESULT] * MAX_HANDS
+        self.result_values = [0] * MAX_HANDS
+        self.pending_cards = [0] * MAX_HANDS
+        self.pending_split_aces = [False] * MAX_HANDS
+
+    # plays a hand and everything split from it, returns the number of results
+    def play_hands(
+        self, aces, lower_bound, num_cards, duplicate, dealer_card, player, deck
     ):
-        new_card = deck.deal()
-        hand.add_card(new_card)
-        return resolve_player_action(hand, dealer_card, player, deck)
-    if action == Actions.SPLIT or action == Actions.SPLIT_IF_DOUBLE:
-        player.increment_num_hands()
-        card_1, card_2 = hand.get_cards()[0], hand.get_cards()[1]
-        card_1_2 = deck.deal()
-        # deal with split aces
-        if aces > 0 and (card_1_2 != Cards.ACE or player.get_num_hands() == 4):
-            new_value = card_1_2.value if card_1_2 != Cards.ACE else 1
-            result_1 = [(PlayerResultTypes.LIVE, Cards.ACE.value + new_value)]
-        else:
-            result_1 = resolve_player_action(
-                Hand([card_1, card_1_2]), dealer_card, player, deck
-            )
+        table = player.action_table
+        result_codes = self.result_codes
+        result_values = self.result_values
+        pending_cards = self.pending_cards
+        pending_split_aces = self.pending_split_aces
+        num_results = 0
+        num_pending = 0
+
+        while True:
+            # play the current hand until it is done or split
+            while True:
+                upper_bound = lower_bound + 10 if aces else lower_bound
+                best_value = upper_bound if upper_bound <= 21 else lower_bound
+
+                if lower_bound > 21:
+                    result_codes[num_results] = BUST_RESULT
+                    result_values[num_results] = best_value
+                    num_results += 1
+                    break
+                if upper_bound == 21 and player.num_hands == 1 and num_cards == 2:
+                    result_codes[num_results] = BLACKJACK_RESULT
+                    result_values[num_results] = best_value
+                    num_results += 1
+                    break
+
+                if duplicate and player.num_hands < 4:
+                    state = PAIR_STATES + (ACE_VALUE if aces else lower_bound // 2)
+                elif aces and lower_bound <= 10 and not duplicate:
+                    state = SOFT_STATES + upper_bound
+                else:
+                    state = HARD_STATES + best_value
+                action = table[state * NUM_DEALER_CARDS + dealer_card]
+
+                if (
+                    action == STAND_CODE
+                    or (action == DOUBLE_STAND_CODE and num_cards > 2)
+                    or (action == SURRENDER_STAND_CODE and num_cards > 2)
+                ):
+                    result_codes[num_results] = LIVE_RESULT
+                    result_values[num_results] = best_value
+                    num_results += 1
+                    break
+                if (
+                    action == HIT_CODE
+                    or (action == DOUBLE_HIT_CODE and num_cards > 2)
+                    or (action == SURRENDER_HIT_CODE and num_cards > 2)
+                ):
+                    new_card = deck.deal()
+                    if new_card == ACE_VALUE:
+                        aces += 1
+                        lower_bound += 1
+                    else:
+                        lower_bound += new_card
+                    num_cards += 1
+                    duplicate = False
+                    continue
+                if action == SPLIT_CODE or action == SPLIT_IF_DOUBLE_CODE:
+                    player.num_hands += 1
+                    # both halves wait for their second card, the first half
+                    # goes on top so it is played out first
+                    card = ACE_VALUE if aces else lower_bound // 2
+                    for _ in range(2):
+                        pending_cards[num_pending] = card
+                        pending_split_aces[num_pending] = aces > 0
+                        num_pending += 1
+                    break
+                if action == DOUBLE_STAND_CODE or action == DOUBLE_HIT_CODE:
+                    new_card = deck.deal()
+                    if new_card == ACE_VALUE:
+                        new_upper = upper_bound + (1 if aces > 0 else 11)
+                        new_lower = lower_bound + 1
+                    else:
+                        new_upper = upper_bound + new_card
+                        new_lower = lower_bound + new_card
+                    value = new_upper if new_upper <= 21 else new_lower
+                    result_codes[num_results] = (
+                        DOUBLE_RESULT if value <= 21 else BUST_RESULT
+                    )
+                    result_values[num_results] = value
+                    num_results += 1
+                    break
+                # the surrenders, with two cards
+                result_codes[num_results] = SURRENDER_RESULT
+                result_values[num_results] = best_value
+                num_results += 1
+                break
+
+            # deal the next split hand its second card
+            while True:
+                if num_pending == 0:
+                    return num_results
+                num_pending -= 1
+                card = pending_cards[num_pending]
+                new_card = deck.deal()
+                if pending_split_aces[num_pending] and (
+                    new_card != ACE_VALUE or player.num_hands == 4
+                ):
+                    result_codes[num_results] = LIVE_RESULT
+                    result_values[num_results] = ACE_VALUE + (
+                        new_card if new_card != ACE_VALUE else 1
+                    )
+                    num_results += 1
+                    continue
+                aces = (card == ACE_VALUE) + (new_card == ACE_VALUE)
+                lower_bound = (1 if card == ACE_VALUE else card) + (
+                    1 if new_card == ACE_VALUE else new_card
+                )
+                num_cards = 2
+                duplicate = card == new_card
+                break
+
+
+def resolve_player_action(hand: "Hand", dealer_card: "Card", player: Player, deck):
+    engine = player.round_engine
+    num_results = engine.play_hands(
+        hand.aces,
+        hand.lower_bound,
+        hand.num_cards,
+        hand.is_duplicate(),
+        int(dealer_card),
+        player,
+        deck,
+    )
+    return [
+        (RESULT_TYPES[engine.result_codes[i]], engine.result_values[i])
+        for i in range(num_results)
+    ]
 
-        card_2_2 = deck.deal()
-        if aces > 0 and (card_2_2 != Cards.ACE or player.get_num_hands() == 4):
-            new_value = card_2_2.value if card_2_2 != Cards.ACE else 1
-            result_2 = [(PlayerResultTypes.LIVE, Cards.ACE.value + new_value)]
-        else:
-            result_2 = resolve_player_action(
-                Hand([card_2, card_2_2]), dealer_card, player, deck
-            )
 
-        return result_1 + result_2
-    if action == Actions.DOUBLE_STAND or action == Actions.DOUBLE_HIT:
-        new_card = deck.deal()
-        if new_card == Cards.ACE:
-            if aces > 0:
-                new_upper = upper_bound + 1
-                new_lower = lower_bound + 1
+# draws to the dealer's final total, a bust is anything over 21
+def resolve_dealer_value(aces, lower_bound, deck):
+    while True:
+        upper_bound = lower_bound + 10 if aces else lower_bound
+        dealer_value = lower_bound if upper_bound > 21 else upper_bound
+        # hits soft 17
+        if dealer_value < 17 or (upper_bound == 17 and aces > 0):
+            new_card = deck.deal()
+            if new_card == ACE_VALUE:
+                aces += 1
+                lower_bound += 1
             else:
-                new_upper = upper_bound + 11
-                new_lower = lower_bound + 1
+                lower_bound += new_card
         else:
-            new_upper = upper_bound + new_card.value
-            new_lower = lower_bound + new_card.value
-        value = new_upper if new_upper <= 21 else new_lower
-        state = PlayerResultTypes.DOUBLE if value <= 21 else PlayerResultTypes.BUST
-        return [(state, value)]
-
-    if (
-        action == Actions.SURRENDER_HIT
-        or action == Actions.SURRENDER_SPLIT
-        or Actions.SURRENDER_STAND
-    ):
-        return [(PlayerResultTypes.SURRENDER, best_value)]
+            return dealer_value
 
 
 def resolve_dealer_action(hand: "Hand", deck, num_cards=2):
@@ -394,131 +992,726 @@ def resolve_dealer_action(hand: "Hand", deck, num_cards=2):
     dealer_value = lower_bound if upper_bound > 21 else upper_bound
     if num_cards == 2 and dealer_value == 21:
         return (DealerResultTypes.BLACKJACK, 21)
-    if dealer_value < 17 or (
-        upper_bound == 17 and aces > 0 and lower_bound < upper_bound
-    ):
-        new_card = deck.deal()
-        hand.add_card(new_card)
-        return resolve_dealer_action(hand, deck, num_cards + 1)
+    dealer_value = resolve_dealer_value(aces, lower_bound, deck)
+    if dealer_value > 21:
+        return (DealerResultTypes.BUST, dealer_value)
     else:
-        if dealer_value > 21:
-            return (DealerResultTypes.BUST, dealer_value)
-        else:
-            return (DealerResultTypes.LIVE, dealer_value)
+        return (DealerResultTypes.LIVE, dealer_value)
+
+
+class SessionLimits:
+    """Table limits and early stops for a session.
+
+    Wagers from the betting ramp are raised to the table minimum and cut to
+    the table maximum and to what is left of the bankroll. A ramp wager of 0
+    sits the round out. With stop_at_ruin the session ends once the bankroll
+    can no longer cover the table minimum (or is gone), and with a win_goal
+    once the session is that much up."""
+
+    def __init__(
+        self,
+        table_min: float = 0,
+        table_max: float = None,
+        win_goal: float = None,
+        stop_at_ruin: bool = True,
+    ):
+        if table_min < 0:
+            raise ValueError("Table minimum can not be negative")
+        if table_max is not None and table_max < table_min:
+            raise ValueError("Table maximum is below the table minimum")
+        self.table_min = table_min
+        self.table_max = table_max
+        self.win_goal = win_goal
+        self.stop_at_ruin = stop_at_ruin
+
+    def get_wager(self, wager, bankroll):
+        if wager <= 0:
+            return 0
+        wager = max(wager, self.table_min)
+        if self.table_max is not None:
+            wager = min(wager, self.table_max)
+        return max(0, min(wager, bankroll))
+
+    def is_over(self, profit, bankroll):
+        if self.stop_at_ruin and (bankroll <= 0 or bankroll < self.table_min):
+            return True
+        return self.win_goal is not None and profit >= self.win_goal
 
 
 def check_if_new_deck(deck, threshold, num_decks):
     if deck.check_threshhold(threshold):
-        deck = Deck(num_decks)
-        deck.shuffle()
-        Deck.num_times_created += 1
+        deck.reshuffle(num_decks)
     return deck
 
 
+# plays one round and returns its net result per unit wagered, which is what
+# a flat bet of one unit would have made on the same cards
 def play(player, deck, wager=1):
 
     dealer_card_open, dealer_card_closed = deck.deal(), deck.deal()
     player_card1, player_card2 = deck.deal(), deck.deal()
     player.increment_num_hands()
-    dealer_blackjack = dealer_card_open.value + dealer_card_closed.value == 21
-    player_blackjack = player_card1.value + player_card2.value == 21
+    dealer_blackjack = dealer_card_open + dealer_card_closed == 21
+    player_blackjack = player_card1 + player_card2 == 21
 
     if dealer_blackjack and not player_blackjack:
         player.payout(-wager)
-        return
+        return -1
     elif dealer_blackjack and player_blackjack:
-        return
+        return 0
     elif not dealer_blackjack and player_blackjack:
         player.payout(wager * 1.5)
-        return
+        return 1.5
     else:
-        final_numbers = resolve_player_action(
-            Hand([player_card1, player_card2]), dealer_card_open, player, deck
+        engine = player.round_engine
+        num_results = engine.play_hands(
+            (player_card1 == ACE_VALUE) + (player_card2 == ACE_VALUE),
+            (1 if player_card1 == ACE_VALUE else player_card1)
+            + (1 if player_card2 == ACE_VALUE else player_card2),
+            2,
+            player_card1 == player_card2,
+            dealer_card_open,
+            player,
+            deck,
         )
+        result_codes = engine.result_codes
+        result_values = engine.result_values
         num_surrenders = 0
         num_busts = 0
-        live_hands = []
-        num_hands = player.get_num_hands()
-        for i in final_numbers:
-            if i[RESULT_IDX] == PlayerResultTypes.SURRENDER:
+        for i in range(num_results):
+            if result_codes[i] == SURRENDER_RESULT:
                 num_surrenders += 1
-            elif i[RESULT_IDX] == PlayerResultTypes.BUST:
+            elif result_codes[i] == BUST_RESULT:
                 num_busts += 1
-            else:
-                live_hands.append(i)
 
+        outcome = -(num_surrenders * 1 / 2 + num_busts)
         if num_surrenders + num_busts > 0:
-            player.payout(-(num_surrenders * 1 / 2 + num_busts) * wager)
+            player.payout(outcome * wager)
 
         # are there any live hands
-        live_hands_n = num_hands - (num_surrenders + num_busts)
-        if live_hands_n > 0:
-            dealer_final = resolve_dealer_action(
-                Hand([dealer_card_open, dealer_card_closed]), deck
+        if num_results - (num_surrenders + num_busts) > 0:
+            dealer_value = resolve_dealer_value(
+                (dealer_card_open == ACE_VALUE) + (dealer_card_closed == ACE_VALUE),
+                (1 if dealer_card_open == ACE_VALUE else dealer_card_open)
+                + (1 if dealer_card_closed == ACE_VALUE else dealer_card_closed),
+                deck,
             )
-            for i in live_hands:
-                if i[RESULT_IDX] == PlayerResultTypes.LIVE:
-                    if (i[VALUE_IDX] > dealer_final[VALUE_IDX]) or dealer_final[
-                        RESULT_IDX
-                    ] == DealerResultTypes.BUST:
-                        player.payout(wager)
-                    elif i[VALUE_IDX] == dealer_final[VALUE_IDX]:
-                        continue
-                    else:
-                        player.payout(-wager)
-                elif i[RESULT_IDX] == PlayerResultTypes.DOUBLE:
-                    if (i[VALUE_IDX] > dealer_final[VALUE_IDX]) or dealer_final[
-                        RESULT_IDX
-                    ] == DealerResultTypes.BUST:
-                        player.payout(2 * wager)
-                    elif i[VALUE_IDX] == dealer_final[VALUE_IDX]:
-                        continue
-                    else:
-                        player.payout(-2 * wager)
+            for i in range(num_results):
+                result_code = result_codes[i]
+                if result_code == LIVE_RESULT:
+                    multiplier = 1
+                elif result_code == DOUBLE_RESULT:
+                    multiplier = 2
+                elif result_code == SURRENDER_RESULT or result_code == BUST_RESULT:
+                    continue
                 else:
                     raise Exception("There is a bug here")
-        return
+                if result_values[i] > dealer_value or dealer_value > 21:
+                    player.payout(multiplier * wager)
+                    outcome += multiplier
+                elif result_values[i] < dealer_value:
+                    player.payout(-multiplier * wager)
+                    outcome -= multiplier
+        return outcome
 
 
 def resolve_environment(
-    player, starting_deck=None, num_decks=6, iterations=1000, threshold=0.35
+    player,
+    starting_deck=None,
+    num_decks=6,
+    iterations=1000,
+    threshold=0.35,
+    shoe_type=ShoeTypes.SHOE,
 ):
     if not starting_deck:
-        deck = Deck(num_decks)
-        deck.shuffle()
+        if shoe_type == ShoeTypes.SHOE:
+            deck = Deck(num_decks, counting_system=player.get_counting_system())
+            deck.shuffle()
+        else:
+            deck = make_deck(shoe_type, num_decks, player.get_counting_system())
     else:
         deck = starting_deck
 
     for i in range(iterations):
-        true_count = deck.get_true_count()
-        wager = player.calculate_wager(true_count)
+        wager = player.calculate_wager(deck.get_betting_count())
         play(player=player, deck=deck, wager=wager)
         player.next_round()
+        deck.end_round()
         deck = check_if_new_deck(deck, threshold, num_decks)
 
 
-def worker(num_decks, player, iterations, threshold):
+def worker(
+    num_decks,
+    player,
+    iterations,
+    threshold,
+    with_metrics=False,
+    seed=None,
+    shoe_type=ShoeTypes.SHOE,
+    with_control=False,
+    limits=None,
+    round_log=None,
+):
+    """Profit of one session. with_metrics adds the number of reshuffles and
+    with_control adds the flat bet control, what betting one unit every
+    round would have made on the same cards. With SessionLimits the wagers
+    are kept to the table and the bankroll, and the session can end before
+    iterations rounds. round_log is a (counts, cards left, outcomes) triple
+    of arrays that gets each round's running count and cards left before the
+    deal and its unit outcome."""
     starting = player.get_bankroll()
-    deck = Deck(num_decks)
+    deck = make_deck(shoe_type, num_decks, player.get_counting_system(), seed)
+    control = 0
     for i in range(iterations):
-        true_count = deck.get_true_count()
-        wager = player.calculate_wager(true_count)
-        play(player=player, deck=deck, wager=wager)
+        count = deck.get_betting_count()
+        if round_log is not None:
+            round_log[0][i] = deck.get_count()
+            round_log[1][i] = deck.get_cards_left()
+        wager = player.calculate_wager(count)
+        if limits is not None:
+            bankroll = player.get_bankroll()
+            if limits.is_over(bankroll - starting, bankroll):
+                break
+            wager = limits.get_wager(wager, bankroll)
+        outcome = play(player=player, deck=deck, wager=wager)
+        control += outcome
+        if round_log is not None:
+            round_log[2][i] = outcome
         player.next_round()
+        deck.end_round()
         deck = check_if_new_deck(deck, threshold, num_decks)
-    return player.get_bankroll() - starting
+    output = (player.get_bankroll() - starting,)
+    if with_metrics:
+        output += (deck.get_num_reshuffles(),)
+    if with_control:
+        output += (control,)
+    return output if len(output) > 1 else output[0]
+
+
+def run_batch(
+    player,
+    num_decks,
+    iterations,
+    threshold,
+    seeds,
+    with_metrics=False,
+    shoe_type=ShoeTypes.SHOE,
+    with_control=False,
+    limits=None,
+    cancelled=None,
+):
+    """Runs one session per seed, each with its own copy of player, and
+    returns the profits as a float64 array, plus the reshuffles per session
+    as an int64 array when with_metrics is set and the flat bet controls as
+    a float64 array when with_control is set.
+
+    cancelled is a one element array checked before every session. Once it
+    is set the batch stops, and only the sessions already played are
+    returned."""
+    results = numpy.empty(len(seeds), dtype=numpy.float64)
+    reshuffles = numpy.empty(len(seeds), dtype=numpy.int64)
+    controls = numpy.empty(len(seeds), dtype=numpy.float64)
+    for i, seed in enumerate(seeds):
+        if cancelled is not None and cancelled[0]:
+            results, reshuffles, controls = results[:i], reshuffles[:i], controls[:i]
+            break
+        results[i], reshuffles[i], controls[i] = worker(
+            num_decks,
+            player.copy(),
+            iterations,
+            threshold,
+            with_metrics=True,
+            seed=seed,
+            shoe_type=shoe_type,
+            with_control=True,
+            limits=limits,
+        )
+    output = (results,)
+    if with_metrics:
+        output += (reshuffles,)
+    if with_control:
+        output += (controls,)
+    return output if len(output) > 1 else output[0]
+
+
+# imap_unordered hands a task one argument, and the batch start index comes
+# back with the results since batches finish in any order
+def run_indexed_batch(arguments):
+    cancel_name, start, player, batch_arguments, shoe_type, limits = arguments
+    return start, run_batch(
+        player,
+        *batch_arguments,
+        with_metrics=True,
+        shoe_type=shoe_type,
+        with_control=True,
+        limits=limits,
+        cancelled=attach_cancel_flag(cancel_name),
+    )
 
 
-def parallel_processing(
-    player, num_decks=6, iterations=1000, n_samples=100, threshold=0.35
+def run_summary_batch(arguments):
+    # seeds are made here from the root's entropy, so a run of millions of
+    # sessions never holds millions of seeds or results in one place
+    (
+        cancel_name,
+        player,
+        entropy,
+        start,
+        stop,
+        batch_arguments,
+        shoe_type,
+        limits,
+        k,
+    ) = arguments
+    seeds = get_session_seeds(numpy.random.SeedSequence(entropy), start, stop)
+    results = run_batch(
+        player,
+        *batch_arguments,
+        seeds,
+        shoe_type=shoe_type,
+        limits=limits,
+        cancelled=attach_cancel_flag(cancel_name),
+    )
+    return SessionSummary(k).update(results)
+
+
+class SharedBuffers:
+    """Session results in shared memory.
+
+    The parent allocates the blocks and pool workers attach to them by name,
+    so results are written in place by session index instead of coming back
+    as pickled return values. The parent owns the blocks and unlinks them on
+    close."""
+
+    def __init__(self, n_samples: int):
+        self.n_samples = n_samples
+        # a block can not be empty
+        size = max(1, n_samples * 8)
+        self.results = shared_memory.SharedMemory(create=True, size=size)
+        self.reshuffles = shared_memory.SharedMemory(create=True, size=size)
+        self.controls = shared_memory.SharedMemory(create=True, size=size)
+
+    def get_names(self):
+        return (
+            self.results.name,
+            self.reshuffles.name,
+            self.controls.name,
+        )
+
+    def get_results(self) -> numpy.ndarray:
+        return numpy.ndarray(
+            self.n_samples, dtype=numpy.float64, buffer=self.results.buf
+        ).copy()
+
+    def get_reshuffles(self) -> numpy.ndarray:
+        return numpy.ndarray(
+            self.n_samples, dtype=numpy.int64, buffer=self.reshuffles.buf
+        ).copy()
+
+    def get_controls(self) -> numpy.ndarray:
+        return numpy.ndarray(
+            self.n_samples, dtype=numpy.float64, buffer=self.controls.buf
+        ).copy()
+
+    def close(self):
+        for block in [self.results, self.reshuffles, self.controls]:
+            block.close()
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# shared memory blocks this pool worker is attached to, by role, with an
+# array view on each. an attachment is kept until the parent hands out a
+# block with a new name. pool workers share the parent's resource tracker,
+# so they leave the unregistering to the parent's unlink
+worker_blocks = {}
+
+
+def attach_shared_array(role: str, name: str, shape, dtype) -> numpy.ndarray:
+    attached = worker_blocks.get(role)
+    if attached is None or attached[0].name != name:
+        if attached is not None:
+            block, array = worker_blocks.pop(role)
+            # the view has to go before the block can be closed
+            del array, attached
+            block.close()
+        block = shared_memory.SharedMemory(name=name)
+        worker_blocks[role] = (block, numpy.ndarray(shape, dtype, buffer=block.buf))
+    return worker_blocks[role][1]
+
+
+class CancelFlag:
+    """One byte of shared memory that tells a run's tasks to stop. Unlike
+    terminating the executor, setting it stops only this run, and other runs
+    on the same workers carry on."""
+
+    def __init__(self):
+        self.block = shared_memory.SharedMemory(create=True, size=1)
+        self.block.buf[0] = 0
+
+    def get_name(self):
+        return self.block.name
+
+    def set(self):
+        self.block.buf[0] = 1
+
+    def is_set(self):
+        return bool(self.block.buf[0])
+
+    def close(self):
+        self.block.close()
+        self.block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_cancel_flag(name):
+    return attach_shared_array("cancel", name, (1,), numpy.uint8)
+
+
+def imap_cancellable(executor, func, arguments):
+    """executor.imap_unordered(func, arguments), with the run's cancel flag
+    name put in front of each task's arguments. Closing the generator early
+    sets the flag and waits for the run's tasks, which stop after the
+    session they are playing, so the flag is never unlinked under them."""
+    with CancelFlag() as flag:
+        tasks = executor.imap_unordered(
+            func, [(flag.get_name(),) + tuple(task) for task in arguments]
+        )
+        finished = False
+        try:
+            for output in tasks:
+                yield output
+            finished = True
+        finally:
+            if not finished:
+                flag.set()
+                try:
+                    for _ in tasks:
+                        pass
+                except Exception:
+                    # the run is over, so a failed task has nobody to tell
+                    pass
+
+
+def run_shared_batch(
+    names,
+    n_samples,
+    player,
+    num_decks,
+    iterations,
+    threshold,
+    seeds,
+    start,
+    shoe_type=ShoeTypes.SHOE,
+    limits=None,
 ):
-    pool = Pool()
+    """Plays sessions start to start + len(seeds) and writes their profits,
+    reshuffles and flat bet controls into the shared result arrays. The
+    player comes with the task like in run_batch, only the results are
+    shared."""
+    results_name, reshuffles_name, controls_name = names
+    results = attach_shared_array("results", results_name, n_samples, numpy.float64)
+    reshuffles = attach_shared_array(
+        "reshuffles", reshuffles_name, n_samples, numpy.int64
+    )
+    controls = attach_shared_array("controls", controls_name, n_samples, numpy.float64)
+    for i, seed in enumerate(seeds):
+        results[start + i], reshuffles[start + i], controls[start + i] = worker(
+            num_decks,
+            player.copy(),
+            iterations,
+            threshold,
+            with_metrics=True,
+            seed=seed,
+            shoe_type=shoe_type,
+            with_control=True,
+            limits=limits,
+        )
+
+
+class SimulationExecutor:
+    """A long lived process pool for parallel_processing. The pool is started
+    on first use and its workers stay warm across calls until resize or
+    shutdown, so small runs no longer pay for process start up and imports.
+
+    Players travel with the tasks, a couple of KB each for a handful of
+    tasks per worker, so a new player or betting ramp reuses the running
+    workers."""
+
+    def __init__(self, processes: int = None):
+        self.processes = processes
+        self.pool = None
+
+    def get_pool(self):
+        if self.pool is None:
+            self.pool = Pool(self.processes)
+        return self.pool
+
+    def get_processes(self):
+        return self.processes or os.cpu_count()
+
+    def is_running(self):
+        return self.pool is not None
+
+    def resize(self, processes: int):
+        # workers are started lazily with the new size on the next call
+        if processes != self.processes:
+            self.shutdown()
+            self.processes = processes
+
+    def starmap(self, func, arguments):
+        return self.get_pool().starmap(func, arguments)
+
+    def imap_unordered(self, func, arguments):
+        return self.get_pool().imap_unordered(func, arguments)
+
+    # stops the workers without waiting for the tasks they are running
+    def terminate(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+default_executor = None
+
+
+def get_default_executor() -> SimulationExecutor:
+    global default_executor
+    if default_executor is None:
+        default_executor = SimulationExecutor()
+        atexit.register(default_executor.shutdown)
+    return default_executor
+
+
+def get_session_seeds(root, start, stop):
+    # the same seeds as root.spawn(stop)[start:], without making the others
+    return [
+        numpy.random.SeedSequence(
+            root.entropy, spawn_key=root.spawn_key + (i,), pool_size=root.pool_size
+        )
+        for i in range(start, stop)
+    ]
+
+
+def get_batches(n_samples, seed, executor, batches_per_worker, first_session=0):
+    # independent shoe streams per session, reproducible when seed is given
+    # and whatever the batching. session i always gets the i-th child seed,
+    # so a run can be extended with first_session set to what was already run
+    seeds = get_session_seeds(
+        numpy.random.SeedSequence(seed), first_session, first_session + n_samples
+    )
+    num_batches = max(1, min(n_samples, executor.get_processes() * batches_per_worker))
+    return numpy.array_split(numpy.array(seeds, dtype=object), num_batches)
+
+
+def stream_sessions(
+    player,
+    num_decks=6,
+    iterations=1000,
+    n_samples=100,
+    threshold=0.35,
+    seed=None,
+    shoe_type=ShoeTypes.SHOE,
+    executor=None,
+    batches_per_worker=4,
+    progress_callback=None,
+    with_control=False,
+    limits=None,
+    first_session=0,
+):
+    """Yields (start, results, reshuffles) for each batch of sessions as soon
+    as it finishes, in completion order, where results and reshuffles are the
+    arrays for sessions start to start + len(results), with the flat bet
+    controls added when with_control is set. progress_callback is called
+    with (sessions done, n_samples) after each batch.
+
+    Closing the generator before the last batch cancels the run. Its
+    remaining batches stop after the session they are playing, and the
+    executor stays up for other runs."""
+    if executor is None:
+        executor = get_default_executor()
+    arguments = []
+    start = 0
+    for batch in get_batches(
+        n_samples, seed, executor, batches_per_worker, first_session
+    ):
+        arguments.append(
+            (
+                start,
+                player,
+                (num_decks, iterations, threshold, batch),
+                shoe_type,
+                limits,
+            )
+        )
+        start += len(batch)
+
+    done = 0
+    tasks = imap_cancellable(executor, run_indexed_batch, arguments)
+    with closing(tasks):
+        for start, (results, reshuffles, controls) in tasks:
+            done += len(results)
+            if progress_callback is not None:
+                progress_callback(done, n_samples)
+            if with_control:
+                yield start, results, reshuffles, controls
+            else:
+                yield start, results, reshuffles
+
+
+def summarize_sessions(
+    player,
+    num_decks=6,
+    iterations=1000,
+    n_samples=100,
+    threshold=0.35,
+    seed=None,
+    shoe_type=ShoeTypes.SHOE,
+    executor=None,
+    batch_size=10000,
+    progress_callback=None,
+    limits=None,
+    k=200,
+):
+    """Plays the same sessions as parallel_processing with the same seed but
+    returns only their SessionSummary. Each worker summarizes its batch of
+    at most batch_size sessions and the parent merges the summaries as they
+    finish, so memory does not grow with n_samples. progress_callback is
+    called with (sessions done, n_samples) after each batch."""
+    if executor is None:
+        executor = get_default_executor()
+    entropy = numpy.random.SeedSequence(seed).entropy
+    num_batches = max(executor.get_processes() * 4, math.ceil(n_samples / batch_size))
+    bounds = numpy.linspace(0, n_samples, min(n_samples, num_batches) + 1)
+    bounds = bounds.astype(numpy.int64)
     arguments = [
-        (num_decks, player.copy(), iterations, threshold) for i in range(n_samples)
+        (
+            player,
+            entropy,
+            int(start),
+            int(stop),
+            (num_decks, iterations, threshold),
+            shoe_type,
+            limits,
+            k,
+        )
+        for start, stop in zip(bounds[:-1], bounds[1:])
     ]
-    output = pool.starmap(worker, arguments)
-    pool.close()
-    return output
+
+    summary = SessionSummary(k)
+    tasks = imap_cancellable(executor, run_summary_batch, arguments)
+    with closing(tasks):
+        for batch_summary in tasks:
+            summary.merge(batch_summary)
+            if progress_callback is not None:
+                progress_callback(summary.get_count(), n_samples)
+    return summary
+
+
+def parallel_processing(
+    player,
+    num_decks=6,
+    iterations=1000,
+    n_samples=100,
+    threshold=0.35,
+    with_metrics=False,
+    seed=None,
+    shoe_type=ShoeTypes.SHOE,
+    executor=None,
+    batches_per_worker=4,
+    shared=False,
+    with_control=False,
+    limits=None,
+    first_session=0,
+    progress_callback=None,
+):
+    if executor is None:
+        executor = get_default_executor()
+    if shared:
+        batches = get_batches(
+            n_samples, seed, executor, batches_per_worker, first_session
+        )
+        with SharedBuffers(n_samples) as buffers:
+            arguments = []
+            start = 0
+            for batch in batches:
+                arguments.append(
+                    (
+                        buffers.get_names(),
+                        n_samples,
+                        player,
+                        num_decks,
+                        iterations,
+                        threshold,
+                        batch,
+                        start,
+                        shoe_type,
+                        limits,
+                    )
+                )
+                start += len(batch)
+            executor.starmap(run_shared_batch, arguments)
+            results = buffers.get_results()
+            reshuffles = buffers.get_reshuffles()
+            controls = buffers.get_controls()
+    else:
+        results = numpy.empty(n_samples, dtype=numpy.float64)
+        reshuffles = numpy.empty(n_samples, dtype=numpy.int64)
+        controls = numpy.empty(n_samples, dtype=numpy.float64)
+        # closing the stream cancels the rest of the run if the caller's
+        # progress_callback raises
+        stream = stream_sessions(
+            player,
+            num_decks,
+            iterations,
+            n_samples,
+            threshold,
+            seed,
+            shoe_type,
+            executor,
+            batches_per_worker,
+            progress_callback,
+            with_control=True,
+            limits=limits,
+            first_session=first_session,
+        )
+        with closing(stream):
+            for start, batch_results, batch_reshuffles, batch_controls in stream:
+                stop = start + len(batch_results)
+                results[start:stop] = batch_results
+                reshuffles[start:stop] = batch_reshuffles
+                controls[start:stop] = batch_controls
+
+    # session results, then reshuffles per session and flat bet controls
+    output = (results,)
+    if with_metrics:
+        output += (reshuffles,)
+    if with_control:
+        output += (controls,)
+    return output if len(output) > 1 else output[0]
 
 
 if __name__ == "__main__":
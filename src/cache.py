@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy
+
+from blackjack import (
+    Player,
+    SessionLimits,
+    ShoeTypes,
+    SimulationExecutor,
+    parallel_processing,
+)
+from storage import RESULT_EXTENSION, get_scenario_metadata, load_results, save_results
+from variance import (
+    FLAT_BET_CONTROL_SEED,
+    FLAT_BET_CONTROL_SESSIONS,
+    FLAT_BETTING_POLICY,
+    estimate_flat_bet_mean,
+)
+
+# bump when a change to the engine changes what a seeded session returns, so
+# results cached by an older engine are no longer found
+ENGINE_VERSION = 1
+
+
+class ResultCache:
+    """Session results on local disk, addressed by a hash of everything that
+    decides them: rules, compiled policy, betting ramp, counting system,
+    decks, penetration, rounds per session, limits and seed.
+
+    Session i of a seeded run is the same however many sessions are asked
+    for, so an entry holding fewer sessions than requested is topped up by
+    running only the missing ones. Entries are result files, and the least
+    recently used ones are removed once the cache grows past max_bytes."""
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def get_key(metadata: dict) -> str:
+        config = dict(metadata)
+        # how many sessions were run is not part of what they are
+        config.pop("n_samples", None)
+        config["engine_version"] = ENGINE_VERSION
+        encoded = json.dumps(config, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + RESULT_EXTENSION)
+
+    def lookup(self, key: str):
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            return None
+        # reading an entry makes it the most recently used
+        os.utime(path)
+        return load_results(path)
+
+    def store(self, key: str, columns, metadata: dict):
+        # written next to the entry and moved in place, so readers never see
+        # half a file
+        file, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(file)
+        try:
+            save_results(temporary, columns, metadata)
+            os.replace(temporary, self.get_path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+        self.evict(keep=key)
+
+    def get_entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(RESULT_EXTENSION):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def get_size(self):
+        return sum(size for _, size, _ in self.get_entries())
+
+    def evict(self, keep: str = None):
+        entries = self.get_entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            # the entry just written stays even if it alone is over the limit
+            if keep is not None and name == keep + RESULT_EXTENSION:
+                continue
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        for _, _, name in self.get_entries():
+            os.remove(os.path.join(self.directory, name))
+
+    def run(
+        self,
+        player: Player,
+        num_decks: int = 6,
+        iterations: int = 1000,
+        n_samples: int = 100,
+        threshold: float = 0.35,
+        seed: int = 0,
+        shoe_type: ShoeTypes = ShoeTypes.SHOE,
+        executor: SimulationExecutor = None,
+        limits: SessionLimits = None,
+        with_metrics: bool = False,
+        with_control: bool = False,
+        progress_callback=None,
+    ):
+        """parallel_processing through the cache. Returns what
+        parallel_processing would return for the same arguments."""
+        if not isinstance(seed, (int, numpy.integer)):
+            raise ValueError("Only runs with an integer seed can be cached")
+        seed = int(seed)
+        metadata = get_scenario_metadata(
+            player, num_decks, iterations, n_samples, threshold, seed, shoe_type, limits
+        )
+        key = self.get_key(metadata)
+        cached = self.lookup(key)
+        num_cached = len(cached) if cached is not None else 0
+
+        columns = {}
+        if num_cached:
+            for name in cached.get_column_names():
+                columns[name] = numpy.array(cached.get_column(name)[:n_samples])
+        if num_cached < n_samples:
+            results, reshuffles, controls = parallel_processing(
+                player,
+                num_decks=num_decks,
+                iterations=iterations,
+                n_samples=n_samples - num_cached,
+                threshold=threshold,
+                with_metrics=True,
+                seed=seed,
+                shoe_type=shoe_type,
+                executor=executor,
+                with_control=True,
+                limits=limits,
+                first_session=num_cached,
+                progress_callback=progress_callback,
+            )
+            new_columns = {
+                "profit": results,
+                "reshuffles": reshuffles,
+                "control": controls,
+            }
+            for name, values in new_columns.items():
+                if name in columns:
+                    values = numpy.concatenate([columns[name], values])
+                columns[name] = values
+            self.store(key, columns, metadata)
+        elif progress_callback is not None:
+            progress_callback(n_samples, n_samples)
+
+        output = (columns["profit"],)
+        if with_metrics:
+            output += (columns["reshuffles"],)
+        if with_control:
+            output += (columns["control"],)
+        return output if len(output) > 1 else output[0]
+
+    def get_flat_bet_mean(
+        self,
+        player: Player,
+        num_decks: int = 6,
+        iterations: int = 1000,
+        threshold: float = 0.35,
+        n_samples: int = FLAT_BET_CONTROL_SESSIONS,
+    ):
+        """estimate_flat_bet_mean through the cache. The flat bet mean only
+        depends on the rules, the playing policy, the counting system, the
+        decks, penetration and rounds per session, so it is estimated once
+        from a fixed seed and shared by every run of them, whatever their
+        seed, length or betting ramp. An entry from fewer than n_samples
+        sessions is estimated again."""
+        metadata = get_scenario_metadata(
+            player, num_decks, iterations, n_samples, threshold
+        )
+        metadata["betting_policy"] = {
+            "wager_amts": list(FLAT_BETTING_POLICY[0]),
+            "ranges": list(FLAT_BETTING_POLICY[1]),
+        }
+        # none of these change the mean
+        for name in ["seed", "bankroll"]:
+            metadata.pop(name)
+        metadata["estimate"] = "flat_bet_mean"
+        key = self.get_key(metadata)
+        cached = self.lookup(key)
+        if cached is not None and cached.get_column("sessions")[0] >= n_samples:
+            mean, sem = cached.get_column("mean")[0], cached.get_column("sem")[0]
+            return float(mean), float(sem)
+        mean, sem = estimate_flat_bet_mean(
+            player,
+            num_decks=num_decks,
+            iterations=iterations,
+            threshold=threshold,
+            n_samples=n_samples,
+            seed=FLAT_BET_CONTROL_SEED,
+        )
+        columns = {
+            "mean": numpy.array([mean]),
+            "sem": numpy.array([sem]),
+            "sessions": numpy.array([n_samples]),
+        }
+        self.store(key, columns, metadata)
+        return mean, sem
@@ -0,0 +1,64 @@
+from statistics import NormalDist
+from typing import List
+
+import numpy
+
+from accumulators import RunningStats
+from blackjack import Player, ShoeTypes, SimulationExecutor, parallel_processing
+
+
+def compare_players(
+    players: List[Player],
+    num_decks: int = 6,
+    iterations: int = 1000,
+    n_samples: int = 100,
+    threshold: float = 0.35,
+    seed=None,
+    shoe_type: ShoeTypes = ShoeTypes.SHOE,
+    executor: SimulationExecutor = None,
+) -> numpy.ndarray:
+    """Runs every player on the same seeded sequence of shoes (common random
+    numbers) and returns their session results as an array with one row per
+    player, so column i holds what each player made from the shoes of
+    session i.
+
+    Players who bet differently but play the same policy see exactly the same
+    cards. Players with different policies start every shoe from the same
+    order and drift apart as they take different numbers of cards."""
+    if seed is None:
+        # the players have to share the seed, so draw one up front
+        seed = int(numpy.random.SeedSequence().generate_state(1)[0])
+    results = numpy.empty((len(players), n_samples), dtype=numpy.float64)
+    for i, player in enumerate(players):
+        results[i] = parallel_processing(
+            player,
+            num_decks=num_decks,
+            iterations=iterations,
+            n_samples=n_samples,
+            threshold=threshold,
+            seed=seed,
+            shoe_type=shoe_type,
+            executor=executor,
+        )
+    return results
+
+
+def paired_differences(results: numpy.ndarray, baseline: int = 0) -> numpy.ndarray:
+    # per session difference of every player against the baseline player
+    return results - results[baseline]
+
+
+def summarize_differences(
+    results: numpy.ndarray, baseline: int = 0, confidence: float = 0.95
+):
+    """Mean paired difference against the baseline player with its normal
+    confidence interval, as a (mean, low, high) tuple per player. The
+    baseline's own row is all zeros."""
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    summary = []
+    for differences in paired_differences(results, baseline):
+        stats = RunningStats().update(differences)
+        mean = stats.get_mean()
+        half_width = z * stats.get_sem() if stats.get_variance() > 0 else 0.0
+        summary.append((mean, mean - half_width, mean + half_width))
+    return summary
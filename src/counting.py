@@ -0,0 +1,119 @@
+from typing import Dict, List, Optional
+
+# card values as dealt by Deck: 2-10 and 11 for an ace
+CARD_VALUES = list(range(2, 11 + 1))
+TEN_VALUE = 10
+
+
+class CountingSystem:
+    """A card counting system compiled to a tag table indexed by card value,
+    so counting a dealt card is a single list index and add."""
+
+    def __init__(
+        self,
+        name: str,
+        tags: Dict[int, float],
+        initial_count_per_deck: float = 0,
+        initial_count_offset: float = 0,
+        pivot: float = 0,
+        use_true_count: Optional[bool] = None,
+    ):
+        missing = [value for value in CARD_VALUES if value not in tags]
+        if missing:
+            raise ValueError("Missing tags for card values {}".format(missing))
+        self.name = name
+        self.initial_count_per_deck = initial_count_per_deck
+        self.initial_count_offset = initial_count_offset
+        self.pivot = pivot
+        self.tags = self.compile_tags(tags)
+        if use_true_count is None:
+            use_true_count = self.is_balanced()
+        self.use_true_count = use_true_count
+
+    @staticmethod
+    def compile_tags(tags: Dict[int, float]) -> List[float]:
+        # index 0 and 1 are never dealt, they are only there so a card value
+        # can be used as the index directly
+        compiled = [0] * (max(CARD_VALUES) + 1)
+        for value in CARD_VALUES:
+            compiled[value] = tags[value]
+        return compiled
+
+    def is_balanced(self):
+        return self.get_deck_total() == 0
+
+    # sum of tags over one 52 card deck
+    def get_deck_total(self):
+        return sum(
+            self.tags[value] * (16 if value == TEN_VALUE else 4)
+            for value in CARD_VALUES
+        )
+
+    def get_initial_count(self, num_decks: int):
+        return self.initial_count_offset + self.initial_count_per_deck * num_decks
+
+    def get_betting_count(self, count, cards_left: int, cards_in_a_deck: int = 52):
+        """True count for balanced systems, running count for unbalanced ones
+        unless use_true_count is set.
+
+        The true count is taken relative to the pivot, the running count at
+        which an unbalanced system's edge no longer depends on the cards
+        left: pivot + (count - pivot) / decks left. A balanced system's pivot
+        is 0, which makes this the usual count / decks left, and an
+        unbalanced one gets a true count estimate that agrees with its
+        running count at the pivot."""
+        if self.use_true_count:
+            return self.pivot + (count - self.pivot) / (cards_left / cards_in_a_deck)
+        return count
+
+    def get_tags(self):
+        return self.tags
+
+    def get_name(self):
+        return self.name
+
+    def get_pivot(self):
+        return self.pivot
+
+    def __repr__(self):
+        return "CountingSystem({})".format(self.name)
+
+
+HI_LO = CountingSystem(
+    "HI_LO", {2: 1, 3: 1, 4: 1, 5: 1, 6: 1, 7: 0, 8: 0, 9: 0, 10: -1, 11: -1}
+)
+
+# unbalanced, starts at 4 - 4 * decks so the running count ends the shoe at +4
+KO = CountingSystem(
+    "KO",
+    {2: 1, 3: 1, 4: 1, 5: 1, 6: 1, 7: 1, 8: 0, 9: 0, 10: -1, 11: -1},
+    initial_count_per_deck=-4,
+    initial_count_offset=4,
+    pivot=4,
+)
+
+HI_OPT_I = CountingSystem(
+    "HI_OPT_I", {2: 0, 3: 1, 4: 1, 5: 1, 6: 1, 7: 0, 8: 0, 9: 0, 10: -1, 11: 0}
+)
+
+HI_OPT_II = CountingSystem(
+    "HI_OPT_II", {2: 1, 3: 1, 4: 2, 5: 2, 6: 1, 7: 1, 8: 0, 9: 0, 10: -2, 11: 0}
+)
+
+OMEGA_II = CountingSystem(
+    "OMEGA_II", {2: 1, 3: 1, 4: 2, 5: 2, 6: 2, 7: 1, 8: 0, 9: -1, 10: -2, 11: 0}
+)
+
+ZEN = CountingSystem(
+    "ZEN", {2: 1, 3: 1, 4: 2, 5: 2, 6: 2, 7: 1, 8: 0, 9: 0, 10: -2, 11: -1}
+)
+
+WONG_HALVES = CountingSystem(
+    "WONG_HALVES",
+    {2: 0.5, 3: 1, 4: 1, 5: 1.5, 6: 1, 7: 0.5, 8: 0, 9: -0.5, 10: -1, 11: -1},
+)
+
+COUNTING_SYSTEMS = {
+    system.get_name(): system
+    for system in [HI_LO, KO, HI_OPT_I, HI_OPT_II, OMEGA_II, ZEN, WONG_HALVES]
+}
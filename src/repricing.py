@@ -0,0 +1,131 @@
+import numpy
+
+from blackjack import (
+    BettingRamp,
+    Player,
+    ShoeTypes,
+    SimulationExecutor,
+    get_batches,
+    get_default_executor,
+    worker,
+)
+from counting import HI_LO, CountingSystem
+
+
+class RoundLog:
+    """Per round record of a set of sessions, one row per session and one
+    column per round: the running count and cards left before the deal and
+    the round's net result per unit wagered. Play never depends on the
+    wager, so any betting policy can be priced over the log without
+    replaying a hand.
+
+    Running counts and unit outcomes are multiples of 0.5 well inside
+    +-1024, which float16 holds exactly, so a round takes 6 bytes and the
+    betting counts come out bit for bit what the deck bet off."""
+
+    def __init__(
+        self,
+        counts: numpy.ndarray,
+        cards_left: numpy.ndarray,
+        outcomes: numpy.ndarray,
+        counting_system: CountingSystem = HI_LO,
+    ):
+        if not counts.shape == cards_left.shape == outcomes.shape:
+            raise ValueError("Counts and outcomes need one value per round each")
+        self.counts = counts
+        self.cards_left = cards_left
+        self.outcomes = outcomes
+        self.counting_system = counting_system
+
+    def get_counts(self):
+        return self.counts
+
+    def get_cards_left(self):
+        return self.cards_left
+
+    def get_outcomes(self):
+        return self.outcomes
+
+    def get_num_sessions(self):
+        return self.counts.shape[0]
+
+    def get_num_rounds(self):
+        return self.counts.shape[1]
+
+    def get_betting_counts(self) -> numpy.ndarray:
+        return self.counting_system.get_betting_count(
+            self.counts.astype(numpy.float64), self.cards_left.astype(numpy.float64)
+        )
+
+    # what a flat one unit bettor made in each session, the flat bet control
+    def get_controls(self) -> numpy.ndarray:
+        return self.outcomes.sum(axis=1, dtype=numpy.float64)
+
+
+def new_round_log(
+    n_samples: int, iterations: int, counting_system: CountingSystem = HI_LO
+) -> RoundLog:
+    shape = (n_samples, iterations)
+    return RoundLog(
+        numpy.zeros(shape, dtype=numpy.float16),
+        numpy.zeros(shape, dtype=numpy.int16),
+        numpy.zeros(shape, dtype=numpy.float16),
+        counting_system,
+    )
+
+
+def record_batch(
+    player: Player,
+    num_decks,
+    iterations,
+    threshold,
+    seeds,
+    shoe_type=ShoeTypes.SHOE,
+):
+    log = new_round_log(len(seeds), iterations, player.get_counting_system())
+    for i, seed in enumerate(seeds):
+        worker(
+            num_decks,
+            player.copy(),
+            iterations,
+            threshold,
+            seed=seed,
+            shoe_type=shoe_type,
+            round_log=(log.counts[i], log.cards_left[i], log.outcomes[i]),
+        )
+    return log.counts, log.cards_left, log.outcomes
+
+
+def record_sessions(
+    player: Player,
+    num_decks: int = 6,
+    iterations: int = 1000,
+    n_samples: int = 100,
+    threshold: float = 0.35,
+    seed=None,
+    shoe_type: ShoeTypes = ShoeTypes.SHOE,
+    executor: SimulationExecutor = None,
+    batches_per_worker: int = 4,
+) -> RoundLog:
+    """Plays the same sessions as parallel_processing with the same seed and
+    returns their RoundLog. The player's betting policy does not matter."""
+    if executor is None:
+        executor = get_default_executor()
+    arguments = [
+        (player, num_decks, iterations, threshold, batch, shoe_type)
+        for batch in get_batches(n_samples, seed, executor, batches_per_worker)
+    ]
+    output = executor.starmap(record_batch, arguments)
+    return RoundLog(
+        numpy.concatenate([i[0] for i in output]),
+        numpy.concatenate([i[1] for i in output]),
+        numpy.concatenate([i[2] for i in output]),
+        player.get_counting_system(),
+    )
+
+
+def reprice(log: RoundLog, betting_policy) -> numpy.ndarray:
+    """Session profits under betting_policy, the per session dot product of
+    the ramp's wagers at the logged counts with the unit outcomes."""
+    wagers = BettingRamp(betting_policy).get_wagers(log.get_betting_counts())
+    return numpy.einsum("ij,ij->i", wagers, log.outcomes.astype(numpy.float64))
@@ -0,0 +1,188 @@
+import math
+from typing import List
+
+import numpy
+from aenum import Enum
+
+from blackjack import (
+    Player,
+    ShoeTypes,
+    SimulationExecutor,
+    check_if_new_deck,
+    get_default_executor,
+    make_deck,
+    play,
+)
+
+# largest seed handed to a deck or a branch
+MAX_SEED = 2**63
+
+
+class SessionEndTypes(str, Enum):
+    LOWER = "LOWER"
+    UPPER = "UPPER"
+    MAX_ROUNDS = "MAX_ROUNDS"
+
+
+def play_until(
+    player: Player,
+    deck,
+    lower: float,
+    upper: float,
+    rounds_played: int,
+    max_rounds: int,
+    threshold: float,
+    num_decks: int,
+):
+    """Plays rounds until the bankroll drops to lower or below, reaches upper
+    or above, or max_rounds have been played in the session. Returns how the
+    session ended and the rounds played so far."""
+    while True:
+        bankroll = player.get_bankroll()
+        if bankroll <= lower:
+            return SessionEndTypes.LOWER, rounds_played
+        if bankroll >= upper:
+            return SessionEndTypes.UPPER, rounds_played
+        if rounds_played >= max_rounds:
+            return SessionEndTypes.MAX_ROUNDS, rounds_played
+        wager = player.calculate_wager(deck.get_betting_count())
+        play(player=player, deck=deck, wager=wager)
+        player.next_round()
+        deck.end_round()
+        deck = check_if_new_deck(deck, threshold, num_decks)
+        rounds_played += 1
+
+
+def run_splitting(
+    player: Player,
+    levels: List[float],
+    target: float,
+    max_rounds: int,
+    num_decks: int,
+    threshold: float,
+    n_per_level: int,
+    seed=None,
+    shoe_type: ShoeTypes = ShoeTypes.SHOE,
+):
+    """One fixed effort multilevel splitting estimate of the chance that the
+    bankroll falls to levels[-1] before it reaches target.
+
+    n_per_level sessions start from the player's bankroll and play until they
+    drop to levels[0] or reach the target. The sessions that made it down are
+    branched, cycling through them, into n_per_level sessions that carry on
+    towards levels[1], and so on. The estimate is the product of the
+    fractions that made it through each level, with the fractions returned
+    alongside."""
+    rng = numpy.random.default_rng(seed)
+    counting_system = player.get_counting_system()
+    sessions = [
+        (
+            player.copy(),
+            make_deck(
+                shoe_type, num_decks, counting_system, int(rng.integers(MAX_SEED))
+            ),
+            0,
+        )
+        for _ in range(n_per_level)
+    ]
+    fractions = []
+    for level in levels:
+        reached = []
+        for session_player, deck, rounds_played in sessions:
+            end, rounds_played = play_until(
+                session_player,
+                deck,
+                level,
+                target,
+                rounds_played,
+                max_rounds,
+                threshold,
+                num_decks,
+            )
+            if end == SessionEndTypes.LOWER:
+                reached.append((session_player, deck, rounds_played))
+        fractions.append(len(reached) / n_per_level)
+        if not reached:
+            break
+        sessions = [
+            (
+                reached[i % len(reached)][0].copy(),
+                reached[i % len(reached)][1].branch(int(rng.integers(MAX_SEED))),
+                reached[i % len(reached)][2],
+            )
+            for i in range(n_per_level)
+        ]
+    if len(fractions) < len(levels):
+        return 0.0, fractions
+    return math.prod(fractions), fractions
+
+
+def get_levels(bankroll: float, ruin_level: float, num_levels: int) -> List[float]:
+    # evenly spaced bankroll thresholds between the start and ruin
+    return [
+        float(level) for level in numpy.linspace(bankroll, ruin_level, num_levels + 1)
+    ][1:]
+
+
+def estimate_risk_of_ruin(
+    player: Player,
+    target: float,
+    num_decks: int = 6,
+    threshold: float = 0.35,
+    max_rounds: int = 100000,
+    ruin_level: float = 0,
+    levels: List[float] = None,
+    num_levels: int = 4,
+    n_per_level: int = 200,
+    n_replicates: int = 8,
+    seed=None,
+    shoe_type: ShoeTypes = ShoeTypes.SHOE,
+    executor: SimulationExecutor = None,
+):
+    """Chance that a session starting from the player's bankroll is ruined,
+    falls to ruin_level, before it reaches target within max_rounds.
+
+    Rare ruins are reached through multilevel splitting over bankroll
+    thresholds (levels, descending, ending at ruin_level, or num_levels even
+    steps). n_replicates independent splitting runs are spread over the
+    executor, and their spread gives the standard error. A single level is
+    plain Monte Carlo.
+
+    Returns (estimate, standard error, replicate estimates)."""
+    bankroll = player.get_bankroll()
+    if not ruin_level < bankroll < target:
+        raise ValueError("The bankroll has to be between ruin and the target")
+    if levels is None:
+        levels = get_levels(bankroll, ruin_level, num_levels)
+    levels = list(levels)
+    if levels[-1] != ruin_level or any(
+        later >= earlier for earlier, later in zip([bankroll] + levels, levels)
+    ):
+        raise ValueError("Levels have to fall from the bankroll to ruin")
+    if n_replicates < 2:
+        raise ValueError("Need at least two replicates for an error bar")
+    if executor is None:
+        executor = get_default_executor()
+
+    seeds = numpy.random.SeedSequence(seed).spawn(n_replicates)
+    arguments = [
+        (
+            player,
+            levels,
+            target,
+            max_rounds,
+            num_decks,
+            threshold,
+            n_per_level,
+            seeds[i],
+            shoe_type,
+        )
+        for i in range(n_replicates)
+    ]
+    output = executor.starmap(run_splitting, arguments)
+    estimates = numpy.array([i[0] for i in output])
+    return (
+        float(estimates.mean()),
+        float(estimates.std(ddof=1) / math.sqrt(n_replicates)),
+        estimates,
+    )
@@ -0,0 +1,133 @@
+import math
+from statistics import NormalDist
+
+import numpy
+
+from accumulators import RunningStats
+from blackjack import (
+    Player,
+    SessionLimits,
+    ShoeTypes,
+    SimulationExecutor,
+    parallel_processing,
+)
+
+PRECISION_REACHED = "PRECISION"
+DECISION_REACHED = "DECISION"
+MAX_SAMPLES_REACHED = "MAX_SAMPLES"
+
+
+class ConfidenceSequence:
+    """Confidence intervals for the mean that stay valid however often they
+    are looked at, so stopping on the first interval that is tight enough
+    (or excludes 0) keeps the coverage. With num_looks known each look
+    spends alpha / num_looks of the error budget. Otherwise look k spends
+    alpha * 6 / (pi^2 k^2), which adds up to alpha over any number of looks
+    but gets strict quickly, so looks should be few either way."""
+
+    def __init__(self, alpha: float = 0.1, num_looks: int = None):
+        if not 0 < alpha < 1:
+            raise ValueError("alpha has to be between 0 and 1")
+        if num_looks is not None and num_looks < 1:
+            raise ValueError("Need at least one look")
+        self.alpha = alpha
+        self.num_looks = num_looks
+        self.looks = 0
+
+    def get_spent_alpha(self, look: int):
+        if self.num_looks is not None:
+            if look > self.num_looks:
+                raise ValueError("Only {} looks were planned".format(self.num_looks))
+            return self.alpha / self.num_looks
+        return self.alpha * 6 / (math.pi**2 * look**2)
+
+    def look(self, stats: RunningStats):
+        self.looks += 1
+        z = NormalDist().inv_cdf(1 - self.get_spent_alpha(self.looks) / 2)
+        half_width = z * stats.get_sem()
+        return stats.get_mean() - half_width, stats.get_mean() + half_width
+
+    def get_looks(self):
+        return self.looks
+
+
+def get_look_schedule(look_every: int, max_samples: int):
+    # session counts to look at, doubling up to max_samples
+    if look_every < 1:
+        raise ValueError("Need at least one session between looks")
+    schedule = []
+    look_at = look_every
+    while look_at < max_samples:
+        schedule.append(look_at)
+        look_at *= 2
+    return schedule + [max_samples]
+
+
+def run_sequential(
+    player: Player,
+    num_decks: int = 6,
+    iterations: int = 1000,
+    threshold: float = 0.35,
+    seed=None,
+    shoe_type: ShoeTypes = ShoeTypes.SHOE,
+    executor: SimulationExecutor = None,
+    half_width: float = None,
+    decide: bool = False,
+    confidence: float = 0.9,
+    max_samples: int = 10000,
+    look_every: int = 100,
+    progress_callback=None,
+    limits: SessionLimits = None,
+):
+    """Runs sessions until the confidence sequence is narrower than
+    +- half_width, or with decide set until it excludes 0, or until
+    max_samples sessions have been played. Looks come after look_every,
+    2 * look_every, 4 * look_every, ... sessions and at max_samples, so
+    only about log2(max_samples / look_every) looks share the error budget
+    and a run overshoots the sessions it needed at most twofold.
+
+    Returns (results, stats, (low, high), reason) where reason is one of
+    PRECISION_REACHED, DECISION_REACHED and MAX_SAMPLES_REACHED. Each look
+    runs on its own seed drawn from seed, so a seeded run stops at the same
+    point every time."""
+    if half_width is None and not decide:
+        raise ValueError("Need a half width or decide to know when to stop")
+    if max_samples < 1:
+        raise ValueError("Need at least one session")
+    schedule = get_look_schedule(look_every, max_samples)
+    look_seeds = numpy.random.SeedSequence(seed).generate_state(len(schedule))
+    # a look before two sessions is skipped and spends nothing
+    num_looks = max(1, sum(1 for n in schedule if n >= 2))
+    sequence = ConfidenceSequence(1 - confidence, num_looks)
+    stats = RunningStats()
+    results = []
+    interval = (-math.inf, math.inf)
+    reason = MAX_SAMPLES_REACHED
+    for look_at, look_seed in zip(schedule, look_seeds):
+        n_samples = look_at - stats.get_count()
+        batch = parallel_processing(
+            player,
+            num_decks=num_decks,
+            iterations=iterations,
+            n_samples=n_samples,
+            threshold=threshold,
+            seed=int(look_seed),
+            shoe_type=shoe_type,
+            executor=executor,
+            limits=limits,
+        )
+        results.append(batch)
+        stats.update(batch)
+        if progress_callback is not None:
+            progress_callback(stats.get_count(), max_samples)
+        # the variance estimate is too rough to look at before two sessions
+        if stats.get_count() < 2:
+            continue
+        interval = sequence.look(stats)
+        if half_width is not None and (interval[1] - interval[0]) / 2 <= half_width:
+            reason = PRECISION_REACHED
+            break
+        if decide and (interval[0] > 0 or interval[1] < 0):
+            reason = DECISION_REACHED
+            break
+    return numpy.concatenate(results), stats, interval, reason
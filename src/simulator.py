@@ -128,7 +128,7 @@ ranges = [-3, -2, -1, 0, 0, 1, 2, 3]
 betting_policy = (wager_amts, ranges)
 
 if __name__ == "__main__":
-    import pickle
+    from storage import get_scenario_metadata, load_results, save_results
 
     wager_amts = [1, 1, 1, 1, 1, 1, 4, 8, 16]
     ranges = [-3, -2, -1, 0, 0, 1, 2, 3]
@@ -140,13 +140,14 @@ if __name__ == "__main__":
         split_policy=split_policy,
         betting_policy=betting_policy,
     )
+    seed = 0
     results = parallel_processing(
-        player, num_decks=6, iterations=1000, n_samples=5000, threshold=0.35
+        player, num_decks=6, iterations=1000, n_samples=5000, threshold=0.35, seed=seed
     )
     ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
-    filehandler = open("data/vegas_conservative_bets_results.obj", "wb")
-    pickle.dump(results, filehandler)
-    filehandler.close()
-    file = open("data/vegas_conservative_bets_results.obj", "rb")
-    results = pickle.load(file)
-    file.close()
+    save_results(
+        "data/vegas_conservative_bets_results.bjres",
+        {"profit": results},
+        get_scenario_metadata(player, 6, 1000, 5000, 0.35, seed=seed),
+    )
+    results = load_results("data/vegas_conservative_bets_results.bjres")
@@ -0,0 +1,154 @@
+import json
+import struct
+from typing import Dict
+
+import numpy
+
+from blackjack import MAX_HANDS, Player, SessionLimits, ShoeTypes
+
+# file layout: MAGIC, then the format version and the header length as
+# little endian uint32s, then the JSON header padded with spaces, then each
+# column's raw little endian data starting on an ALIGNMENT byte boundary
+MAGIC = b"BJRESULT"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGNMENT = 64
+RESULT_EXTENSION = ".bjres"
+
+
+def align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def get_scenario_metadata(
+    player: Player,
+    num_decks: int,
+    iterations: int,
+    n_samples: int,
+    threshold: float,
+    seed=None,
+    shoe_type: ShoeTypes = ShoeTypes.SHOE,
+    limits: SessionLimits = None,
+) -> dict:
+    """Everything needed to know what a set of session results came from:
+    the table rules, the compiled playing policy, the betting ramp, the
+    counting system and how the sessions were run."""
+    wager_amts, ranges = player.betting_policy
+    return {
+        "rules": {
+            "num_decks": num_decks,
+            "threshold": threshold,
+            "shoe_type": str(ShoeTypes(shoe_type).value),
+            "dealer_hits_soft_17": True,
+            "late_surrender": True,
+            "blackjack_pays": 1.5,
+            "max_hands": MAX_HANDS,
+        },
+        "policy": player.compiled_policy.get_table().hex(),
+        "betting_policy": {"wager_amts": list(wager_amts), "ranges": list(ranges)},
+        "counting_system": player.get_counting_system().get_name(),
+        "bankroll": player.get_bankroll(),
+        "iterations": iterations,
+        "n_samples": n_samples,
+        "seed": seed,
+        "limits": None if limits is None else vars(limits),
+    }
+
+
+def save_results(path: str, columns: Dict[str, numpy.ndarray], metadata: dict):
+    """Writes equal length columns, session profits under "profit" by
+    convention, with the metadata in the JSON header."""
+    arrays = {name: numpy.ascontiguousarray(values) for name, values in columns.items()}
+    lengths = {len(values) for values in arrays.values()}
+    if len(lengths) > 1:
+        raise ValueError("Columns have different lengths")
+    for values in arrays.values():
+        if values.ndim != 1 or values.dtype.kind not in "iuf":
+            raise ValueError("Columns have to be 1-D numeric arrays")
+
+    def get_header(offset):
+        layout = []
+        for name, values in arrays.items():
+            dtype = values.dtype.newbyteorder("<")
+            layout.append(
+                {
+                    "name": name,
+                    "dtype": dtype.str,
+                    "length": len(values),
+                    "offset": offset,
+                }
+            )
+            offset = align(offset + values.nbytes)
+        return {
+            "format_version": FORMAT_VERSION,
+            "columns": layout,
+            "metadata": metadata,
+        }
+
+    # the header holds the column offsets, which depend on the header length
+    data_start = 0
+    while True:
+        header = json.dumps(get_header(data_start)).encode("utf-8")
+        needed = align(PREAMBLE.size + len(header))
+        if needed == data_start:
+            break
+        data_start = needed
+    header = header.ljust(data_start - PREAMBLE.size, b" ")
+
+    with open(path, "wb") as file:
+        file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        file.write(header)
+        for column, values in zip(get_header(data_start)["columns"], arrays.values()):
+            file.seek(column["offset"])
+            file.write(values.astype(column["dtype"], copy=False).tobytes())
+
+
+class ResultFile:
+    """A result file opened for reading. Columns are memory mapped when first
+    asked for, so opening a large file only reads its header."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            magic, version, header_length = PREAMBLE.unpack(file.read(PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError("{} is not a result file".format(path))
+            if version > FORMAT_VERSION:
+                raise ValueError(
+                    "{} has format version {}, newer than {}".format(
+                        path, version, FORMAT_VERSION
+                    )
+                )
+            header = json.loads(file.read(header_length).decode("utf-8"))
+        self.path = path
+        self.version = version
+        self.metadata = header["metadata"]
+        self.layout = {column["name"]: column for column in header["columns"]}
+
+    def get_column(self, name: str) -> numpy.ndarray:
+        column = self.layout[name]
+        dtype = numpy.dtype(column["dtype"])
+        if column["length"] == 0:
+            return numpy.empty(0, dtype=dtype)
+        return numpy.memmap(
+            self.path,
+            dtype=dtype,
+            mode="r",
+            offset=column["offset"],
+            shape=(column["length"],),
+        )
+
+    def get_column_names(self):
+        return list(self.layout)
+
+    def get_metadata(self):
+        return self.metadata
+
+    def get_version(self):
+        return self.version
+
+    def __len__(self):
+        return next(iter(self.layout.values()))["length"] if self.layout else 0
+
+
+def load_results(path: str) -> ResultFile:
+    return ResultFile(path)
@@ -0,0 +1,77 @@
+import math
+from statistics import NormalDist
+
+import numpy
+
+from batch import simulate_sessions
+from blackjack import Player
+
+FLAT_BETTING_POLICY = ([1], [])
+# flat betting sessions behind the control's mean. Its error is added to
+# every adjusted interval, so it has to be small next to the error of the
+# runs, and it is estimated once for each set of rules
+FLAT_BET_CONTROL_SESSIONS = 100000
+FLAT_BET_CONTROL_SEED = 0
+
+
+def estimate_flat_bet_mean(
+    player: Player,
+    num_decks: int = 6,
+    iterations: int = 1000,
+    threshold: float = 0.35,
+    n_samples: int = 10000,
+    seed=None,
+):
+    """Expected session profit of betting one unit every round with the
+    player's policy, the mean of the flat bet control, with its standard
+    error. Flat betting sessions are cheap on the batch engine, so this can
+    afford many more sessions than the run it is a control for. Shoe games
+    only, the batch engine has no continuous shuffler."""
+    flat = Player.from_compiled(
+        player.get_bankroll(),
+        player.compiled_policy,
+        FLAT_BETTING_POLICY,
+        player.get_counting_system(),
+    )
+    results = simulate_sessions(
+        flat,
+        num_decks=num_decks,
+        iterations=iterations,
+        n_samples=n_samples,
+        threshold=threshold,
+        seed=seed,
+    )
+    return float(results.mean()), float(results.std(ddof=1) / math.sqrt(n_samples))
+
+
+def control_variate_mean(
+    results,
+    controls,
+    control_mean: float,
+    control_mean_sem: float = 0.0,
+    confidence: float = 0.95,
+):
+    """Mean session result adjusted with the flat bet control,
+    mean(results) - beta * (mean(controls) - control_mean), where beta is the
+    estimated regression coefficient of the results on the controls. Card
+    luck moves both together, so the adjusted mean has a much smaller
+    standard error. The error of control_mean itself is carried into the
+    interval through control_mean_sem.
+
+    Returns (adjusted mean, low, high, beta)."""
+    results = numpy.asarray(results, dtype=numpy.float64)
+    controls = numpy.asarray(controls, dtype=numpy.float64)
+    n = len(results)
+    if n < 3:
+        raise ValueError("Need at least three sessions to fit the control")
+    control_variance = controls.var(ddof=1)
+    if control_variance > 0:
+        beta = numpy.cov(results, controls)[0, 1] / control_variance
+    else:
+        beta = 0.0
+    adjusted = results.mean() - beta * (controls.mean() - control_mean)
+    residuals = results - beta * controls
+    # one degree of freedom goes to beta
+    variance = residuals.var(ddof=2) / n + beta**2 * control_mean_sem**2
+    half_width = NormalDist().inv_cdf((1 + confidence) / 2) * math.sqrt(variance)
+    return adjusted, adjusted - half_width, adjusted + half_width, beta
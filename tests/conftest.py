@@ -0,0 +1,26 @@
+import pytest
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from simulator import hard_policy, soft_policy, split_policy, betting_policy
+from blackjack import Player
+
+
+@pytest.fixture
+def make_player():
+    """Builds players with the simulator's playing policies. The bankroll,
+    betting policy and any other Player argument can be overridden."""
+
+    def make(bankroll=1000, betting_policy=betting_policy, **kwargs):
+        return Player(
+            bankroll=bankroll,
+            hard_policy=hard_policy,
+            soft_policy=soft_policy,
+            split_policy=split_policy,
+            betting_policy=betting_policy,
+            **kwargs
+        )
+
+    return make
@@ -0,0 +1,135 @@
+import pytest
+import os
+import sys
+import math
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from simulator import hard_policy, soft_policy, split_policy, betting_policy
+from accumulators import (
+    QuantileSketch,
+    RunningStats,
+    SessionSummary,
+    StreamingHistogram,
+)
+from blackjack import (
+    Player,
+    SimulationExecutor,
+    parallel_processing,
+    summarize_sessions,
+)
+import numpy as np
+
+
+def test_running_stats():
+    values = np.random.default_rng(0).normal(3, 2, 1000)
+    stats = RunningStats()
+    for value in values[:10]:
+        stats.add(value)
+    stats.update(values[10:500])
+    other = RunningStats().update(values[500:])
+    stats.merge(other)
+    assert stats.get_count() == 1000
+    assert stats.get_mean() == pytest.approx(values.mean())
+    assert stats.get_variance() == pytest.approx(values.var(ddof=1))
+    assert stats.get_sem() == pytest.approx(values.std(ddof=1) / math.sqrt(1000))
+    assert stats.get_min() == values.min()
+    assert stats.get_max() == values.max()
+
+    empty = RunningStats()
+    assert math.isnan(empty.get_variance())
+    assert empty.merge(RunningStats()).get_count() == 0
+    assert RunningStats().merge(other).get_mean() == pytest.approx(values[500:].mean())
+
+
+def test_quantile_sketch():
+    values = np.random.default_rng(1).normal(0, 500, 200000)
+    quantiles = [0, 0.01, 0.25, 0.5, 0.75, 0.99, 1]
+
+    # nothing is compacted below k values, so quantiles are exact
+    small = QuantileSketch(k=200, seed=0).update(values[:150])
+    assert (
+        small.get_quantiles(quantiles)
+        == np.quantile(values[:150], quantiles, method="inverted_cdf")
+    ).all()
+
+    sketch = QuantileSketch(k=200, seed=0)
+    for i, part in enumerate(np.array_split(values, 23)):
+        sketch.merge(QuantileSketch(k=200, seed=i).update(part))
+    assert sketch.get_count() == len(values)
+    assert sum(len(level) for level in sketch.levels) < 1000
+    estimates = sketch.get_quantiles(quantiles)
+    ranks = [(values <= estimate).mean() for estimate in estimates]
+    assert ranks == pytest.approx(quantiles, abs=0.02)
+    assert sketch.get_cdf([estimates[3]])[0] == pytest.approx(0.5, abs=0.02)
+
+    with pytest.raises(ValueError):
+        sketch.merge(QuantileSketch(k=100))
+    assert math.isnan(QuantileSketch().get_quantile(0.5))
+
+
+def test_streaming_histogram():
+    values = np.random.default_rng(2).normal(0, 500, 50000)
+    histogram = StreamingHistogram(max_bins=64)
+    for part in np.array_split(values, 9):
+        histogram.merge(StreamingHistogram(max_bins=64).update(part))
+    edges, counts = histogram.get_bins()
+    # the width doubled until the results fit, and the counts are exact
+    assert len(counts) <= 64
+    assert histogram.get_width() == 128
+    assert (counts == np.histogram(values, edges)[0]).all()
+    assert counts.sum() == len(values)
+
+    narrow = StreamingHistogram(max_bins=64).update([0.5, 1.5, 1.5, 2.5])
+    assert narrow.get_bins()[1].tolist() == [1, 2, 1]
+    narrow.merge(histogram)
+    assert narrow.get_count() == len(values) + 4
+
+
+def test_session_summary():
+    values = np.random.default_rng(3).normal(0, 5, 151)
+    summary = SessionSummary(num_extremes=10).update(values)
+    box = summary.get_box()
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75], method="inverted_cdf")
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    assert (box["q1"], box["median"], box["q3"]) == (q1, median, q3)
+    assert box["lowerfence"] == values[values >= low].min()
+    assert box["upperfence"] == values[values <= high].max()
+    assert sorted(box["outliers"]) == sorted(values[(values < low) | (values > high)])
+
+    # a summary's size does not depend on the number of sessions
+    many = np.random.default_rng(4).standard_t(3, 200000)
+    summary = SessionSummary(num_extremes=10)
+    for part in np.array_split(many, 20):
+        summary.merge(SessionSummary(num_extremes=10).update(part))
+    assert len(summary.get_box()["outliers"]) <= 20
+    assert len(summary.get_histogram().get_bins()[1]) <= 64
+
+    scaled = SessionSummary().update(values).scale(25)
+    assert scaled.get_stats().get_mean() == pytest.approx(values.mean() * 25)
+    assert scaled.get_stats().get_std() == pytest.approx(values.std(ddof=1) * 25)
+    assert scaled.get_median() == pytest.approx(median * 25)
+    assert scaled.get_histogram().get_bins()[1].sum() == len(values)
+
+
+def test_summarize_sessions():
+    player = Player(
+        bankroll=1000,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    with SimulationExecutor(processes=2) as executor:
+        results = parallel_processing(player, 6, 50, 30, seed=4, executor=executor)
+        summary = summarize_sessions(
+            player, 6, 50, 30, seed=4, executor=executor, batch_size=7
+        )
+    # the same sessions, summarized in batches by the workers
+    stats = summary.get_stats()
+    assert summary.get_count() == 30
+    assert stats.get_mean() == pytest.approx(results.mean())
+    assert stats.get_variance() == pytest.approx(results.var(ddof=1))
+    assert stats.get_min() == results.min()
+    assert stats.get_max() == results.max()
+    assert summary.get_median() == np.quantile(results, 0.5, method="inverted_cdf")
@@ -0,0 +1,44 @@
+import pytest
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from blackjack import ShoeFactory, parallel_processing, worker
+from batch import BatchEngine, simulate_sessions
+from counting import KO
+import numpy as np
+
+
+def test_batch_matches_worker_on_same_shoes(make_player):
+    # without a reshuffle each session plays exactly the shoe worker would
+    for player in [make_player(), make_player(counting_system=KO)]:
+        seeds = np.random.SeedSequence(3).spawn(200)
+        engine = BatchEngine(player, num_decks=6, n_samples=200, threshold=0.35)
+        engine.load_shoes(
+            np.stack(
+                [
+                    np.frombuffer(ShoeFactory(6, seed=s).next_shoe(), dtype=np.uint8)
+                    for s in seeds
+                ]
+            )
+        )
+        results = engine.run(30)
+        assert engine.get_num_reshuffles().sum() == 0
+        expected = [worker(6, player.copy(), 30, 0.35, seed=s) for s in seeds]
+        assert results.tolist() == expected
+
+
+def test_simulate_sessions(make_player):
+    player = make_player()
+    results = simulate_sessions(player, iterations=200, n_samples=400, seed=11)
+    assert results.shape == (400,)
+    assert (results == simulate_sessions(player, 6, 200, 400, seed=11)).all()
+
+    # same distribution as the process pool
+    expected = np.array(parallel_processing(player, 6, 200, 40, seed=11))
+    error = np.sqrt(results.var() / len(results) + expected.var() / len(expected))
+    assert abs(results.mean() - expected.mean()) < 5 * error
+
+    with pytest.raises(ValueError):
+        BatchEngine(player, n_samples=0)
@@ -0,0 +1,97 @@
+import pytest
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from blackjack import SimulationExecutor, parallel_processing
+from cache import ResultCache
+from variance import FLAT_BET_CONTROL_SEED, estimate_flat_bet_mean
+import numpy as np
+
+
+def test_partial_reuse(tmp_path, make_player):
+    player = make_player()
+    cache = ResultCache(str(tmp_path))
+    with SimulationExecutor(processes=2) as executor:
+        full, full_reshuffles = parallel_processing(
+            player, 6, 50, 12, seed=3, executor=executor, with_metrics=True
+        )
+        first = cache.run(player, 6, 50, 5, seed=3, executor=executor)
+        assert (first == full[:5]).all()
+
+        calls = []
+        extended, reshuffles = cache.run(
+            player,
+            6,
+            50,
+            12,
+            seed=3,
+            executor=executor,
+            with_metrics=True,
+            progress_callback=lambda done, total: calls.append((done, total)),
+        )
+        # only the seven missing sessions were run
+        assert calls[-1] == (7, 7)
+        assert (extended == full).all()
+        assert (reshuffles == full_reshuffles).all()
+
+        # a hit runs nothing and a smaller request is a prefix
+        hit = cache.run(player, 6, 50, 4, seed=3, executor=executor)
+        assert (hit == full[:4]).all()
+        assert len(cache.get_entries()) == 1
+
+        # any change to the configuration is a different entry
+        cache.run(player, 6, 50, 4, seed=4, executor=executor)
+        cache.run(player, 6, 60, 4, seed=3, executor=executor)
+        assert len(cache.get_entries()) == 3
+
+
+def test_eviction(tmp_path, make_player):
+    player = make_player()
+    cache = ResultCache(str(tmp_path))
+    with SimulationExecutor(processes=1) as executor:
+        for seed in range(3):
+            cache.run(player, 6, 20, 4, seed=seed, executor=executor)
+        names = sorted(name for _, _, name in cache.get_entries())
+        for age, name in enumerate(names):
+            used = 1000000 + age
+            os.utime(os.path.join(str(tmp_path), name), (used, used))
+        # the least recently used entry goes first
+        cache.max_bytes = cache.get_size() - 1
+        cache.evict()
+        assert sorted(name for _, _, name in cache.get_entries()) == names[1:]
+
+        cache.max_bytes = 0
+        cache.run(player, 6, 20, 4, seed=9, executor=executor)
+        # the entry just written is kept even over the limit
+        assert len(cache.get_entries()) == 1
+
+
+def test_flat_bet_mean(tmp_path, make_player):
+    player = make_player()
+    cache = ResultCache(str(tmp_path))
+    first = cache.get_flat_bet_mean(player, 6, 50, n_samples=40)
+    assert first == estimate_flat_bet_mean(
+        player, 6, 50, n_samples=40, seed=FLAT_BET_CONTROL_SEED
+    )
+    assert len(cache.get_entries()) == 1
+    # the same estimate for the same rules, whatever the betting ramp or
+    # bankroll, and a smaller estimate is not asked for again
+    flat = make_player(bankroll=50, betting_policy=([1], []))
+    assert cache.get_flat_bet_mean(flat, 6, 50, n_samples=40) == first
+    assert cache.get_flat_bet_mean(player, 6, 50, n_samples=20) == first
+    assert len(cache.get_entries()) == 1
+    # a larger one replaces it
+    second = cache.get_flat_bet_mean(player, 6, 50, n_samples=60)
+    assert second != first
+    assert cache.get_flat_bet_mean(player, 6, 50, n_samples=40) == second
+    assert len(cache.get_entries()) == 1
+    cache.get_flat_bet_mean(player, 1, 50, n_samples=40)
+    assert len(cache.get_entries()) == 2
+
+
+def test_unseeded_runs(tmp_path, make_player):
+    cache = ResultCache(str(tmp_path))
+    with pytest.raises(ValueError):
+        cache.run(make_player(), 6, 20, 4, seed=None)
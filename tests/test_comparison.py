@@ -0,0 +1,43 @@
+import pytest
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from simulator import betting_policy
+from blackjack import SimulationExecutor, parallel_processing
+from comparison import compare_players, paired_differences, summarize_differences
+import numpy as np
+
+
+def test_compare_players(make_player):
+    flat = make_player(10000, ([1] * 9, betting_policy[1]))
+    conservative = make_player(10000, ([1, 1, 1, 1, 1, 1, 4, 8, 16], betting_policy[1]))
+    aggressive = make_player(10000, ([1, 1, 1, 1, 1, 1, 8, 16, 32], betting_policy[1]))
+    with SimulationExecutor(processes=1) as executor:
+        results = compare_players(
+            [flat, conservative, aggressive, flat.copy()],
+            num_decks=1,
+            iterations=100,
+            n_samples=60,
+            seed=8,
+            executor=executor,
+        )
+        assert results.shape == (4, 60)
+        expected = parallel_processing(
+            conservative, 1, 100, 60, seed=8, executor=executor
+        )
+        assert (results[1] == expected).all()
+
+    differences = paired_differences(results, baseline=1)
+    assert (differences[1] == 0).all()
+    assert (results[0] == results[3]).all()
+    # on the same shoes the betting strategies move together, so the paired
+    # difference varies much less than two independent runs would
+    assert differences[2].var() < 0.5 * (results[1].var() + results[2].var())
+
+    summary = summarize_differences(results, baseline=0)
+    assert summary[0] == (0, 0, 0) and summary[3] == (0, 0, 0)
+    mean, low, high = summary[2]
+    assert low < mean < high
+    assert mean == pytest.approx((results[2] - results[0]).mean())
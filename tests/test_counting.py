@@ -0,0 +1,90 @@
+import pytest
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from counting import (
+    CountingSystem,
+    COUNTING_SYSTEMS,
+    HI_LO,
+    KO,
+    WONG_HALVES,
+    ZEN,
+)
+from blackjack import Deck, Cards, Player
+from simulator import soft_policy, split_policy, hard_policy
+
+
+def test_counting_system_tags():
+    assert HI_LO.get_tags()[Cards.TWO] == 1
+    assert HI_LO.get_tags()[Cards.SEVEN] == 0
+    assert HI_LO.get_tags()[Cards.KING] == -1
+    assert HI_LO.get_tags()[Cards.ACE] == -1
+    assert ZEN.get_tags()[Cards.FIVE] == 2
+    assert ZEN.get_tags()[Cards.ACE] == -1
+    assert WONG_HALVES.get_tags()[Cards.FIVE] == 1.5
+
+    for name, system in COUNTING_SYSTEMS.items():
+        assert system.is_balanced() == (name != "KO")
+    assert KO.get_deck_total() == 4
+
+    with pytest.raises(ValueError):
+        CountingSystem("BROKEN", {2: 1, 3: 1})
+
+
+def test_full_shoe_counts():
+    for system in COUNTING_SYSTEMS.values():
+        deck = Deck(6, counting_system=system)
+        assert deck.get_count() == system.get_initial_count(6)
+        for _ in range(52 * 6):
+            deck.deal()
+        if system.is_balanced():
+            assert deck.get_count() == 0
+        else:
+            assert deck.get_count() == system.get_pivot()
+
+
+def test_unbalanced_betting_count():
+    wager_amts = [1, 1, 1, 1, 1, 1, 4, 8, 16]
+    ranges = [-3, -2, -1, 0, 0, 1, 2, 3]
+    player = Player(
+        bankroll=100,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=(wager_amts, ranges),
+        counting_system=KO,
+    )
+    deck = Deck(counting_system=player.get_counting_system())
+    deck.set_cards([Cards.SEVEN, Cards.TWO, Cards.SEVEN, Cards.NINE] * 13)
+    assert deck.get_count() == 0
+
+    # KO counts sevens and bets off the running count
+    deck.deal()
+    deck.deal()
+    assert deck.get_count() == 1
+    assert deck.get_betting_count() == 1
+    assert player.calculate_wager(deck.get_betting_count()) == 4
+
+    # or off a true count taken relative to the pivot
+    ko_true = CountingSystem(
+        "KO_TRUE",
+        {2: 1, 3: 1, 4: 1, 5: 1, 6: 1, 7: 1, 8: 0, 9: 0, 10: -1, 11: -1},
+        initial_count_per_deck=-4,
+        initial_count_offset=4,
+        pivot=4,
+        use_true_count=True,
+    )
+    assert ko_true.get_betting_count(4, 52 * 5) == 4
+    assert ko_true.get_betting_count(8, 52 * 2) == 6
+    assert ko_true.get_betting_count(0, 52 * 4) == 3
+    assert HI_LO.get_pivot() == 0
+
+    deck = Deck(counting_system=HI_LO)
+    deck.set_cards([Cards.SEVEN, Cards.TWO, Cards.SEVEN, Cards.NINE] * 13)
+    deck.deal()
+    deck.deal()
+    assert deck.get_count() == 0
+    deck.deal()
+    assert deck.get_betting_count() == 1 / (49 / 52)
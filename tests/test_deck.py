@@ -4,8 +4,19 @@ import sys
 
 ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
 sys.path.append(os.path.join(ROOT, "src"))
-from blackjack import Deck, Cards, Player
+from blackjack import (
+    Deck,
+    Cards,
+    ContinuousShuffler,
+    Player,
+    ShoeFactory,
+    BettingRamp,
+    bisect_wager,
+    new_shoe,
+)
+import numpy as np
 from simulator import soft_policy, split_policy, hard_policy
+from counting import HI_LO, KO, WONG_HALVES, ZEN
 
 
 def test_deck_basic_functions():
@@ -188,3 +199,140 @@ def test_setter_encapsulation():
     deck = Deck()
     with pytest.raises(AssertionError):
         deck.set_cards_left("51")
+
+
+def test_deck_deals_card_values():
+    deck = Deck(2)
+    dealt = [deck.deal() for _ in range(52 * 2)]
+    assert all(type(card) is int for card in dealt)
+    assert sorted(dealt) == sorted([card.value for card in Cards] * 4 * 2)
+    assert dealt.count(Cards.TEN) == 16 * 2
+    assert deck.deal() == -1
+    assert deck.get_count() == 0
+
+
+def test_reshuffle_in_place():
+    deck = Deck(2)
+    buffer = deck.cards
+    for _ in range(80):
+        deck.deal()
+    assert deck.check_threshhold(0.35)
+    deck.reshuffle()
+    assert deck.cards is buffer
+    assert deck.get_cards_left() == 52 * 2
+    assert deck.get_count() == 0
+    assert deck.get_num_reshuffles() == 1
+    assert sorted(deck.get_cards()) == sorted([card.value for card in Cards] * 8)
+
+    # a hand-built deck comes back as a full shoe
+    deck.set_cards([Cards.TEN, Cards.ACE])
+    deck.reshuffle(6)
+    assert deck.get_cards_left() == 52 * 6
+    assert deck.get_num_decks() == 6
+    assert deck.get_num_reshuffles() == 2
+
+
+def test_shoe_factory():
+    factory = ShoeFactory(2, block_size=3, seed=7)
+    shoes = [factory.next_shoe() for _ in range(4)]
+    assert all(len(shoe) == 52 * 2 for shoe in shoes)
+    assert all(sorted(shoe) == sorted(new_shoe(2)) for shoe in shoes)
+    assert len(set(shoes)) == 4
+
+    other = ShoeFactory(2, block_size=3, seed=7)
+    assert [other.next_shoe() for _ in range(4)] == shoes
+
+    deck = Deck(2, shoe_factory=ShoeFactory(2, block_size=3, seed=7))
+    assert bytes(deck.cards) == shoes[0]
+    deck.reshuffle()
+    assert bytes(deck.cards) == shoes[1]
+
+    with pytest.raises(ValueError):
+        Deck(6, shoe_factory=factory)
+
+
+def test_composition():
+    deck = Deck(6)
+    assert deck.get_composition() == [24] * 8 + [96, 24]
+    assert deck.get_decks_remaining() == 6
+
+    deck.set_cards(
+        [Cards.FOUR, Cards.TWO, Cards.SEVEN, Cards.TEN, Cards.NINE, Cards.ACE]
+    )
+    for _ in range(4):
+        deck.deal()
+    assert deck.get_composition() == [1, 0, 1, 0, 0, 0, 0, 0, 0, 0]
+    assert deck.get_rank_probabilities() == [0.5, 0, 0.5, 0, 0, 0, 0, 0, 0, 0]
+    assert deck.get_cards_left() == sum(deck.get_composition())
+
+    # ace, nine, ten, seven dealt
+    assert deck.get_running_count() == -2
+    assert deck.get_running_count(KO) == -1
+    assert deck.get_running_count(ZEN) == -2
+    assert deck.get_true_count() == -2 / (2 / 52)
+    assert deck.get_true_count(WONG_HALVES) == -2 / (2 / 52)
+    assert deck.get_true_count(HI_LO) == deck.get_true_count()
+
+    deck.reshuffle()
+    assert deck.get_composition() == [4] * 8 + [16, 4]
+
+
+def test_continuous_shuffler():
+    deck = ContinuousShuffler(2, seed=11)
+    assert deck.get_cards_left() == 52 * 2
+    assert not deck.check_threshhold(0.99)
+
+    dealt = [deck.deal() for _ in range(52 * 2)]
+    assert sorted(dealt) == sorted(new_shoe(2))
+    assert deck.deal() == -1
+    assert deck.get_count() == 0
+
+    deck.end_round()
+    assert deck.get_cards_left() == 52 * 2
+    assert deck.get_composition() == [8] * 8 + [32, 8]
+
+    deck.set_cards([Cards.TEN, Cards.ACE, Cards.ACE])
+    for _ in range(3):
+        deck.deal()
+    assert deck.get_count() == -3
+    deck.end_round()
+    assert sorted(deck.get_cards()) == [10, 11, 11]
+    assert deck.get_count() == 0
+
+    other = ContinuousShuffler(2, seed=11)
+    assert [other.deal() for _ in range(52 * 2)] == dealt
+
+
+def test_betting_ramp():
+    policies = [
+        ([1, 1, 1, 1, 1, 1, 4, 8, 16], [-3, -2, -1, 0, 0, 1, 2, 3]),
+        ([-16, -8, -4, -1, 0, 1, 4, 8, 16], [-3, -2, -1, 0, 0, 1, 2, 3]),
+        ([1, 1, 1, 8, 16, 32, 32, 32], [0, 0, 1, 2, 3, 4, 5]),
+        ([1, 2, 3, 5, 10], [-1.5, 0.25, 0.5, 2.75]),
+    ]
+    rng = np.random.default_rng(0)
+    counts = list(rng.normal(0, 4, 2000)) + [-100.0, 100.0, -0.0]
+    for betting_policy in policies:
+        ramp = BettingRamp(betting_policy)
+        grid = counts + [i / 4 for i in range(-40, 41)]
+        assert [ramp.get_wager(i) for i in grid] == [
+            bisect_wager(betting_policy, i) for i in grid
+        ]
+        assert list(ramp.get_wagers(np.array(grid))) == [
+            bisect_wager(betting_policy, i) for i in grid
+        ]
+
+    # too fine grained for a table, but the same wagers through bisect
+    for betting_policy in [([1, 2, 3], [1 / 3, 2 / 3]), ([1, 2], [0.0001234])]:
+        ramp = BettingRamp(betting_policy)
+        assert ramp.table is None
+        grid = counts + [0.0001234, 1 / 3, 2 / 3]
+        assert [ramp.get_wager(i) for i in grid] == [
+            bisect_wager(betting_policy, i) for i in grid
+        ]
+        assert list(ramp.get_wagers(np.array(grid))) == [
+            bisect_wager(betting_policy, i) for i in grid
+        ]
+
+    with pytest.raises(ValueError):
+        BettingRamp(([1, 2], [0, 1]))
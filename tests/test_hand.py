@@ -50,3 +50,22 @@ def test_setter_encapsulation():
     deck = Deck()
     with pytest.raises(AssertionError):
         deck.set_cards_left("51")
+
+
+def test_hand_totals_are_incremental():
+    hand = Hand([Cards.ACE, Cards.ACE])
+    assert hand.get_sum() == (2, 2, 12)
+    hand.add_card(Cards.NINE)
+    assert hand.get_sum() == (2, 11, 21)
+    assert not hand.is_duplicate()
+    hand.add_card(Cards.KING)
+    assert hand.get_sum() == (2, 21, 31)
+    assert hand.get_num_cards() == 4
+
+    hand.set_cards([Cards.EIGHT, Cards.EIGHT])
+    hand.set_num_cards(2)
+    assert hand.get_sum() == (0, 16, 16)
+    assert hand.is_duplicate()
+
+    with pytest.raises(AttributeError):
+        hand.value = 16
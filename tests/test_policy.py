@@ -4,8 +4,18 @@ import sys
 
 ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
 sys.path.append(os.path.join(ROOT, "src"))
-from simulator import hard_policy, soft_policy, split_policy
-from blackjack import Actions
+from simulator import hard_policy, soft_policy, split_policy, betting_policy
+from blackjack import (
+    Actions,
+    Cards,
+    CompiledPolicy,
+    Hand,
+    Player,
+    HandTypes,
+    ACTION_CODES,
+)
+import itertools
+import pickle
 
 
 def test_hard_policy():
@@ -277,3 +287,58 @@ def test_split_policy():
     assert split_policy[11][9] == Actions.SPLIT
     assert split_policy[11][10] == Actions.SPLIT
     assert split_policy[11][11] == Actions.SPLIT
+
+
+def test_compiled_policy():
+    player = Player(
+        bankroll=100,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    card_values = [card.value for card in Cards]
+    for num_cards in [2, 3]:
+        for cards in itertools.product(set(card_values), repeat=num_cards):
+            hand = Hand(list(cards), num_cards=num_cards)
+            hand_type, aces, lower_bound, upper_bound = hand.parse_hand()
+            if lower_bound > 21:
+                continue
+            value = lower_bound if upper_bound > 21 else upper_bound
+            for num_hands in [1, 4]:
+                player.num_hands = num_hands
+                for dealer_card in range(2, 11 + 1):
+                    if hand_type == HandTypes.DUPLICATE and num_hands < 4:
+                        expected = split_policy[upper_bound // 2 if not aces else 11]
+                    elif hand_type == HandTypes.SOFT and lower_bound <= 10:
+                        expected = soft_policy[value]
+                    else:
+                        expected = hard_policy[value]
+                    expected = expected[dealer_card]
+                    assert player.get_action(hand, dealer_card)[0] == expected
+                    assert player.get_action_code(hand, dealer_card) == (
+                        ACTION_CODES[expected]
+                    )
+
+
+def test_compiled_policy_pickles_without_dicts():
+    player = Player(
+        bankroll=100,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    unpickled = pickle.loads(pickle.dumps(player))
+    assert unpickled.hard_policy is None
+    assert unpickled.compiled_policy == player.compiled_policy
+    assert unpickled.copy().compiled_policy == player.compiled_policy
+    assert len(pickle.dumps(player)) < len(
+        pickle.dumps((hard_policy, soft_policy, split_policy))
+    )
+
+    hand = Hand([Cards.ACE, Cards.SEVEN])
+    assert unpickled.get_action(hand, Cards.TWO)[0] == Actions.DOUBLE_STAND
+
+    with pytest.raises(ValueError):
+        CompiledPolicy(b"")
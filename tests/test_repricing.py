@@ -0,0 +1,54 @@
+import pytest
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from simulator import betting_policy
+from blackjack import SimulationExecutor, parallel_processing, worker
+from repricing import RoundLog, new_round_log, record_sessions, reprice
+from counting import KO, WONG_HALVES
+import numpy as np
+
+
+def test_round_log(make_player):
+    player = make_player(10000, betting_policy)
+    log = new_round_log(1, 200)
+    profit = worker(
+        1,
+        player.copy(),
+        200,
+        0.35,
+        seed=4,
+        round_log=(log.counts[0], log.cards_left[0], log.outcomes[0]),
+    )
+    assert reprice(log, betting_policy)[0] == profit
+    assert (
+        log.get_controls()[0]
+        == worker(1, player.copy(), 200, 0.35, seed=4, with_control=True)[1]
+    )
+    # six bytes a round
+    assert log.counts.nbytes + log.cards_left.nbytes + log.outcomes.nbytes == 1200
+    with pytest.raises(ValueError):
+        RoundLog(np.zeros((2, 3)), np.zeros((2, 3)), np.zeros((2, 4)))
+
+
+def test_reprice(make_player):
+    conservative = ([1, 1, 1, 1, 1, 1, 4, 8, 16], betting_policy[1])
+    fractional = ([0, 1, 2, 4, 8], [-1, 0.5, 1.5, 2.5])
+    for kwargs in [{}, {"counting_system": KO}, {"counting_system": WONG_HALVES}]:
+        player = make_player(10000, betting_policy, **kwargs)
+        with SimulationExecutor(processes=1) as executor:
+            log = record_sessions(player, 1, 100, 12, seed=6, executor=executor)
+            assert log.get_num_sessions() == 12 and log.get_num_rounds() == 100
+            # any ramp priced from one recording matches a full resimulation
+            for policy in [betting_policy, conservative, fractional]:
+                expected = parallel_processing(
+                    make_player(10000, policy, **kwargs),
+                    1,
+                    100,
+                    12,
+                    seed=6,
+                    executor=executor,
+                )
+                assert (reprice(log, policy) == expected).all()
@@ -16,6 +16,7 @@ from blackjack import (
     resolve_dealer_action,
     DealerResultTypes,
     play,
+    LIVE_RESULT,
 )
 
 import numpy as np
@@ -757,3 +758,24 @@ def test_play_set2():
     player.next_round()
     assert player.get_bankroll() == 95 - 1
     print("yo?")
+
+
+def test_round_engine_buffers():
+    player = Player(
+        bankroll=100,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    player.increment_num_hands()
+    deck = Deck()
+    # eights split three times, every hand stands on 18
+    deck.set_cards([Cards.TEN] * 4 + [Cards.EIGHT] * 2)
+    engine = player.round_engine
+    num_results = engine.play_hands(0, 16, 2, True, Cards.SEVEN, player, deck)
+    assert num_results == 4
+    assert player.get_num_hands() == 4
+    assert engine.result_codes == [LIVE_RESULT] * 4
+    assert engine.result_values == [18] * 4
+    assert deck.get_cards_left() == 0
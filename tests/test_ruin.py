@@ -0,0 +1,88 @@
+import pytest
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from simulator import betting_policy
+from blackjack import ContinuousShuffler, SimulationExecutor, make_deck
+from ruin import (
+    SessionEndTypes,
+    estimate_risk_of_ruin,
+    get_levels,
+    play_until,
+    run_splitting,
+)
+import numpy as np
+
+
+def test_deck_branch():
+    deck = make_deck("SHOE", 2, seed=1)
+    for _ in range(30):
+        deck.deal()
+    first, second = deck.branch(seed=1), deck.branch(seed=2)
+    for branch in [first, second]:
+        assert branch.get_cards_left() == deck.get_cards_left()
+        assert branch.get_count() == deck.get_count()
+        assert sorted(branch.get_cards()) == sorted(deck.get_cards())
+        assert branch.get_composition() == deck.get_composition()
+    assert first.get_cards() != second.get_cards()
+    first.deal()
+    assert first.get_cards_left() == deck.get_cards_left() - 1
+
+    csm = ContinuousShuffler(2, seed=1)
+    branch = csm.branch(seed=3)
+    branch.deal()
+    assert csm.get_cards_left() == 104 and branch.get_cards_left() == 103
+
+
+def test_play_until(make_player):
+    player = make_player(10, ([1] * 9, betting_policy[1]))
+    deck = make_deck("SHOE", 1, seed=4)
+    end, rounds = play_until(player, deck, 5, 15, 0, 10000, 0.35, 1)
+    assert end in [SessionEndTypes.LOWER, SessionEndTypes.UPPER]
+    assert player.get_bankroll() <= 5 or player.get_bankroll() >= 15
+    assert rounds > 0
+    end, _ = play_until(
+        make_player(10, ([1] * 9, betting_policy[1])), deck, 5, 15, 0, 3, 0.35, 1
+    )
+    assert end == SessionEndTypes.MAX_ROUNDS
+    assert get_levels(20, 0, 4) == [15, 10, 5, 0]
+
+
+def test_risk_of_ruin(make_player):
+    player = make_player(10, ([1] * 9, betting_policy[1]))
+    estimate, fractions = run_splitting(player, [5, 0], 20, 100000, 1, 0.35, 50, 1)
+    assert estimate == pytest.approx(np.prod(fractions))
+    assert player.get_bankroll() == 10
+
+    with SimulationExecutor(processes=1) as executor:
+        plain, plain_error, replicates = estimate_risk_of_ruin(
+            player,
+            20,
+            num_decks=1,
+            num_levels=1,
+            n_per_level=100,
+            seed=5,
+            n_replicates=4,
+            executor=executor,
+        )
+        split, split_error, _ = estimate_risk_of_ruin(
+            player,
+            20,
+            num_decks=1,
+            num_levels=3,
+            n_per_level=100,
+            seed=5,
+            n_replicates=4,
+            executor=executor,
+        )
+    assert len(replicates) == 4
+    # close to a fair gambler's ruin from halfway
+    assert 0.3 < plain < 0.7 and 0.3 < split < 0.7
+    assert abs(plain - split) < 4 * np.sqrt(plain_error**2 + split_error**2)
+
+    with pytest.raises(ValueError):
+        estimate_risk_of_ruin(player, 5)
+    with pytest.raises(ValueError):
+        estimate_risk_of_ruin(player, 20, levels=[5, 8, 0])
@@ -1,6 +1,7 @@
 import pytest
 import os
 import sys
+import time
 
 ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
 sys.path.append(os.path.join(ROOT, "src"))
@@ -18,8 +19,18 @@ from blackjack import (
     play,
     resolve_environment,
     parallel_processing,
+    worker,
+    run_batch,
+    SharedBuffers,
+    run_shared_batch,
+    stream_sessions,
+    SessionLimits,
+    ShoeTypes,
+    SimulationExecutor,
+    get_default_executor,
 )
 import numpy as np
+from multiprocessing import shared_memory
 
 
 def test_overall_play():
@@ -78,3 +89,240 @@ def test_parallel():
     )
     output = parallel_processing(player=player, iterations=100, n_samples=10)
     assert len(output) == 10
+
+    output, reshuffles = parallel_processing(
+        player=player, num_decks=1, iterations=100, n_samples=4, with_metrics=True
+    )
+    assert len(output) == 4
+    assert all(i > 0 for i in reshuffles)
+
+    first = parallel_processing(player=player, iterations=100, n_samples=4, seed=3)
+    second = parallel_processing(player=player, iterations=100, n_samples=4, seed=3)
+    assert (first == second).all()
+
+
+def test_shoe_types():
+    player = Player(
+        bankroll=10000,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    result, reshuffles = worker(
+        6, player.copy(), 200, 0.35, with_metrics=True, seed=5, shoe_type=ShoeTypes.CSM
+    )
+    assert reshuffles == 0
+    assert result == worker(6, player.copy(), 200, 0.35, seed=5, shoe_type="CSM")
+
+    resolve_environment(player, num_decks=2, iterations=50, shoe_type=ShoeTypes.CSM)
+    output = parallel_processing(
+        player=player, iterations=100, n_samples=4, shoe_type=ShoeTypes.CSM
+    )
+    assert len(output) == 4
+
+
+def test_executor():
+    player = Player(
+        bankroll=10000,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    assert get_default_executor() is get_default_executor()
+
+    with SimulationExecutor(processes=1) as executor:
+        assert not executor.is_running()
+        first = parallel_processing(
+            player, iterations=50, n_samples=4, seed=1, executor=executor
+        )
+        pool = executor.get_pool()
+        second = parallel_processing(
+            player, iterations=50, n_samples=4, seed=1, executor=executor
+        )
+        assert (first == second).all()
+        # the same workers serve every call
+        assert executor.get_pool() is pool
+
+        executor.resize(2)
+        assert not executor.is_running()
+        assert executor.get_processes() == 2
+        third = parallel_processing(
+            player, iterations=50, n_samples=4, seed=1, executor=executor
+        )
+        assert (third == first).all()
+    assert not executor.is_running()
+
+
+def test_batches():
+    player = Player(
+        bankroll=10000,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    seeds = np.random.SeedSequence(7).spawn(6)
+    results, reshuffles = run_batch(player, 1, 50, 0.35, seeds, with_metrics=True)
+    assert results.dtype == np.float64 and reshuffles.dtype == np.int64
+    assert results.tolist() == [
+        worker(1, player.copy(), 50, 0.35, seed=s) for s in seeds
+    ]
+
+    # the same sessions however they are split into batches
+    with SimulationExecutor(processes=1) as executor:
+        output = parallel_processing(
+            player, 1, 50, 6, seed=7, executor=executor, batches_per_worker=4
+        )
+        assert (output == results).all()
+        pool = executor.get_pool()
+        output = parallel_processing(
+            player, 1, 50, 6, seed=7, executor=executor, batches_per_worker=1
+        )
+        assert (output == results).all()
+        assert executor.get_pool() is pool
+
+        # a new betting policy goes to the running workers with the tasks
+        other = Player(
+            bankroll=10000,
+            hard_policy=hard_policy,
+            soft_policy=soft_policy,
+            split_policy=split_policy,
+            betting_policy=([1] * 9, [-3, -2, -1, 0, 0, 1, 2, 3]),
+        )
+        flat = parallel_processing(other, 1, 50, 6, seed=7, executor=executor)
+        assert executor.get_pool() is pool
+        assert (flat == run_batch(other, 1, 50, 0.35, seeds)).all()
+
+
+def test_shared_memory():
+    player = Player(
+        bankroll=10000,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    seeds = np.random.SeedSequence(9).spawn(5)
+    expected = [worker(1, player.copy(), 50, 0.35, seed=s) for s in seeds]
+
+    with SharedBuffers(5) as buffers:
+        names = buffers.get_names()
+        args = (names, 5, player, 1, 50)
+        run_shared_batch(*args, 0.35, seeds[:2], 0)
+        run_shared_batch(*args, 0.35, seeds[2:], 2)
+        assert buffers.get_results().tolist() == expected
+        assert (buffers.get_reshuffles() > 0).all()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=names[0])
+
+    with SimulationExecutor(processes=1) as executor:
+        output, reshuffles = parallel_processing(
+            player, 1, 50, 5, with_metrics=True, seed=9, executor=executor, shared=True
+        )
+        assert output.tolist() == expected
+        assert (reshuffles > 0).all()
+        # workers reattach to the new blocks of the next run
+        output = parallel_processing(
+            player, 1, 50, 5, seed=9, executor=executor, shared=True
+        )
+        assert output.tolist() == expected
+
+
+def test_stream_sessions():
+    player = Player(
+        bankroll=10000,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    progress = []
+    with SimulationExecutor(processes=2) as executor:
+        expected = parallel_processing(player, 1, 50, 12, seed=4, executor=executor)
+        results = np.zeros(12)
+        for start, batch, reshuffles in stream_sessions(
+            player,
+            1,
+            50,
+            12,
+            seed=4,
+            executor=executor,
+            progress_callback=lambda done, total: progress.append((done, total)),
+        ):
+            assert len(batch) == len(reshuffles)
+            results[start : start + len(batch)] = batch
+        assert (results == expected).all()
+        assert len(progress) == 8 and progress[-1] == (12, 12)
+        assert executor.is_running()
+
+        # walking away from the stream cancels the run, and only the run
+        pool = executor.get_pool()
+        stream = stream_sessions(player, 1, 2000, 40, executor=executor)
+        next(stream)
+        began = time.perf_counter()
+        stream.close()
+        assert time.perf_counter() - began < 5
+        assert executor.get_pool() is pool
+        again = parallel_processing(player, 1, 50, 12, seed=4, executor=executor)
+        assert (again == expected).all()
+
+    seeds = np.random.SeedSequence(7).spawn(3)
+    results, reshuffles = run_batch(
+        player,
+        1,
+        50,
+        0.35,
+        seeds,
+        with_metrics=True,
+        cancelled=np.ones(1, dtype=np.uint8),
+    )
+    assert len(results) == 0 and len(reshuffles) == 0
+
+
+def test_session_limits():
+    limits = SessionLimits(table_min=5, table_max=50, win_goal=100)
+    assert limits.get_wager(1, 1000) == 5
+    assert limits.get_wager(32, 1000) == 32
+    assert limits.get_wager(64, 1000) == 50
+    assert limits.get_wager(32, 20) == 20
+    # a ramp wager of 0 sits the round out
+    assert limits.get_wager(0, 1000) == 0
+    assert limits.is_over(0, 4) and limits.is_over(100, 1100)
+    assert not limits.is_over(99, 1099)
+    assert not SessionLimits(stop_at_ruin=False).is_over(-50, -10)
+    with pytest.raises(ValueError):
+        SessionLimits(table_min=10, table_max=5)
+
+    for seed in range(5):
+        player = Player(
+            bankroll=30,
+            hard_policy=hard_policy,
+            soft_policy=soft_policy,
+            split_policy=split_policy,
+            betting_policy=betting_policy,
+        )
+        profit = worker(
+            1, player, 100000, 0.35, seed=seed, limits=SessionLimits(2, 16, 30)
+        )
+        # every session ends at ruin or at the win goal well before 100000 rounds
+        assert player.get_bankroll() < 2 or profit >= 30
+
+    player = Player(
+        bankroll=30,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    with SimulationExecutor(processes=1) as executor:
+        limits = SessionLimits(2, 16, 30)
+        output = parallel_processing(
+            player, 1, 100000, 6, seed=3, executor=executor, limits=limits
+        )
+        shared = parallel_processing(
+            player, 1, 100000, 6, seed=3, executor=executor, limits=limits, shared=True
+        )
+    assert (output == shared).all()
+    assert ((output >= 30) | (output < -28)).all()
@@ -0,0 +1,113 @@
+import pytest
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from simulator import hard_policy, soft_policy, split_policy, betting_policy
+from blackjack import Player, SimulationExecutor
+from accumulators import RunningStats
+from sequential import (
+    ConfidenceSequence,
+    get_look_schedule,
+    run_sequential,
+    PRECISION_REACHED,
+    DECISION_REACHED,
+    MAX_SAMPLES_REACHED,
+)
+import numpy as np
+
+
+def test_confidence_sequence():
+    stats = RunningStats().update(np.random.default_rng(1).normal(0, 1, 400))
+    sequence = ConfidenceSequence(0.1)
+    first = sequence.look(stats)
+    second = sequence.look(stats)
+    # later looks get less of the error budget and so wider intervals
+    assert first[0] < stats.get_mean() < first[1]
+    assert second[1] - second[0] > first[1] - first[0]
+    assert sum(sequence.get_spent_alpha(k) for k in range(1, 10000)) < 0.1
+
+    # a known number of looks shares the budget evenly
+    planned = ConfidenceSequence(0.1, num_looks=8)
+    assert planned.get_spent_alpha(1) == planned.get_spent_alpha(8) == 0.1 / 8
+    with pytest.raises(ValueError):
+        planned.get_spent_alpha(9)
+
+    assert get_look_schedule(100, 10000) == [
+        100,
+        200,
+        400,
+        800,
+        1600,
+        3200,
+        6400,
+        10000,
+    ]
+    assert get_look_schedule(50, 120) == [50, 100, 120]
+    assert get_look_schedule(100, 100) == [100]
+
+    with pytest.raises(ValueError):
+        ConfidenceSequence(0)
+
+
+def test_run_sequential():
+    player = Player(
+        bankroll=10000,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    with SimulationExecutor(processes=1) as executor:
+        results, stats, interval, reason = run_sequential(
+            player,
+            num_decks=1,
+            iterations=20,
+            seed=2,
+            executor=executor,
+            half_width=8,
+            max_samples=2000,
+            look_every=50,
+        )
+        assert reason == PRECISION_REACHED
+        assert len(results) == stats.get_count() < 2000
+        assert len(results) % 50 == 0
+        assert (interval[1] - interval[0]) / 2 <= 8
+        assert stats.get_mean() == pytest.approx(results.mean())
+
+        again = run_sequential(
+            player, 1, 20, seed=2, executor=executor, half_width=8, look_every=50
+        )
+        assert (again[0] == results).all()
+
+        progress = []
+        results, _, _, reason = run_sequential(
+            player,
+            1,
+            20,
+            seed=2,
+            executor=executor,
+            half_width=0.001,
+            max_samples=120,
+            look_every=50,
+            progress_callback=lambda done, total: progress.append(done),
+        )
+        assert reason == MAX_SAMPLES_REACHED
+        assert len(results) == 120 and progress == [50, 100, 120]
+
+        # a flat betting player who stands on everything is clearly losing
+        losing = Player(
+            bankroll=10000,
+            hard_policy={},
+            soft_policy={},
+            split_policy={},
+            betting_policy=([1] * 9, betting_policy[1]),
+        )
+        _, _, interval, reason = run_sequential(
+            losing, 1, 50, seed=3, executor=executor, decide=True, look_every=50
+        )
+        assert reason == DECISION_REACHED and interval[1] < 0
+
+    with pytest.raises(ValueError):
+        run_sequential(player)
@@ -0,0 +1,66 @@
+import pytest
+import os
+import sys
+import json
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from simulator import hard_policy, soft_policy, split_policy, betting_policy
+from blackjack import CompiledPolicy, Player
+from storage import (
+    FORMAT_VERSION,
+    get_scenario_metadata,
+    load_results,
+    save_results,
+)
+import numpy as np
+
+
+def test_save_and_load(tmp_path):
+    player = Player(
+        bankroll=1000,
+        hard_policy=hard_policy,
+        soft_policy=soft_policy,
+        split_policy=split_policy,
+        betting_policy=betting_policy,
+    )
+    metadata = get_scenario_metadata(player, 6, 1000, 5, 0.35, seed=7)
+    profits = np.array([-59.0, 27.5, 37.0, -93.0, 158.0])
+    reshuffles = np.arange(5, dtype=np.int64)
+    path = str(tmp_path / "results.bjres")
+    save_results(path, {"profit": profits, "reshuffles": reshuffles}, metadata)
+
+    results = load_results(path)
+    assert results.get_version() == FORMAT_VERSION
+    assert len(results) == 5
+    assert results.get_column_names() == ["profit", "reshuffles"]
+    assert isinstance(results.get_column("profit"), np.memmap)
+    assert (results.get_column("profit") == profits).all()
+    assert (results.get_column("reshuffles") == reshuffles).all()
+    assert results.get_column("reshuffles").dtype == np.int64
+
+    # metadata survives the round trip through JSON
+    loaded = results.get_metadata()
+    assert loaded == json.loads(json.dumps(metadata))
+    assert loaded["seed"] == 7 and loaded["rules"]["num_decks"] == 6
+    assert CompiledPolicy(bytes.fromhex(loaded["policy"])) == player.compiled_policy
+    assert loaded["betting_policy"]["wager_amts"] == betting_policy[0]
+
+    empty = str(tmp_path / "empty.bjres")
+    save_results(empty, {"profit": np.empty(0)}, {})
+    assert len(load_results(empty).get_column("profit")) == 0
+
+    with pytest.raises(ValueError):
+        save_results(path, {"profit": profits, "other": reshuffles[:3]}, {})
+    bad = tmp_path / "bad.bjres"
+    bad.write_bytes(b"not a result file at all")
+    with pytest.raises(ValueError):
+        load_results(str(bad))
+
+
+def test_cached_scenarios():
+    for name in ["vegas_aggressive_bets_results", "vegas_conservative_bets_results"]:
+        results = load_results(os.path.join(ROOT, "data", name + ".bjres"))
+        assert len(results) == 5000
+        assert results.get_metadata()["n_samples"] == 5000
+        assert results.get_column("profit").dtype == np.float64
@@ -0,0 +1,64 @@
+import pytest
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "src"))
+from simulator import betting_policy
+from blackjack import SimulationExecutor, parallel_processing, worker
+from variance import control_variate_mean, estimate_flat_bet_mean
+import numpy as np
+
+
+def test_flat_bet_control(make_player):
+    flat = make_player(10000, ([1] * 9, betting_policy[1]))
+    profit, control = worker(1, flat.copy(), 200, 0.35, seed=1, with_control=True)
+    assert profit == control
+
+    player = make_player(10000, betting_policy)
+    with SimulationExecutor(processes=1) as executor:
+        results, reshuffles, controls = parallel_processing(
+            player,
+            1,
+            100,
+            6,
+            with_metrics=True,
+            seed=2,
+            executor=executor,
+            with_control=True,
+        )
+        assert (results == parallel_processing(player, 1, 100, 6, seed=2)).all()
+        shared = parallel_processing(
+            player, 1, 100, 6, seed=2, executor=executor, shared=True, with_control=True
+        )
+        assert (shared[1] == controls).all()
+    flat_results = parallel_processing(flat, 1, 100, 6, seed=2)
+    assert (controls == flat_results).all()
+
+
+def test_control_variate_mean():
+    rng = np.random.default_rng(0)
+    controls = rng.normal(-5, 30, 2000)
+    results = 3 * controls + rng.normal(2, 5, 2000)
+    adjusted, low, high, beta = control_variate_mean(results, controls, -5)
+    assert beta == pytest.approx(3, abs=0.05)
+    assert adjusted == pytest.approx(-13, abs=0.5)
+    naive_half_width = 1.96 * results.std(ddof=1) / np.sqrt(2000)
+    assert (high - low) / 2 < naive_half_width / 5
+
+    # an uncertain control mean widens the interval
+    _, wider_low, wider_high, _ = control_variate_mean(results, controls, -5, 1.0)
+    assert wider_high - wider_low > high - low
+
+    with pytest.raises(ValueError):
+        control_variate_mean([1, 2], [1, 2], 0)
+
+
+def test_estimate_flat_bet_mean(make_player):
+    player = make_player(10000, betting_policy)
+    mean, sem = estimate_flat_bet_mean(player, 1, 100, n_samples=500, seed=3)
+    assert 0 < sem < 2
+    flat = make_player(10000, ([1] * 9, betting_policy[1]))
+    expected = parallel_processing(flat, 1, 100, 100, seed=3)
+    error = np.sqrt(sem**2 + expected.var() / 100)
+    assert abs(mean - expected.mean()) < 5 * error